@@ -1,53 +1,120 @@
-from ultralytics import YOLO
 import cv2
 import numpy as np
+import hashlib
+import os
+from .inference_backends import export_model, OnnxRuntimeBackend
 
 class YOLODetector:
-    def __init__(self, model_path="yolov8n.pt"):
-        print(f"[AI] Loading YOLO model from {model_path}...")
+    def __init__(self, model_path="yolov8n.pt", backend="torch", threads=None):
+        print(f"[AI] Loading YOLO model from {model_path} (backend: {backend})...")
+        self.model_path = model_path
+        self.backend = backend
+        self.model_version = self._model_version(model_path, backend)
+        self.model = None    # ultralytics YOLO (torch backend)
+        self.runtime = None  # exported model runtime (onnx / onnx-int8 / openvino)
         try:
-            self.model = YOLO(model_path)
+            if backend == "torch":
+                from ultralytics import YOLO  # only the torch backend needs ultralytics / PyTorch
+                self.model = YOLO(model_path)
+            else:
+                runtime_path = export_model(model_path, backend)
+                self.runtime = OnnxRuntimeBackend(runtime_path, threads=threads, openvino=(backend == "openvino"))
+                print(f"[AI] Using {backend} runtime: {runtime_path}")
         except Exception as e:
             print(f"[AI] Error loading model: {e}")
-            self.model = None
+
+    @property
+    def ready(self):
+        return self.model is not None or self.runtime is not None
+
+    @staticmethod
+    def _model_version(model_path, backend="torch"):
+        """
+        Identifies the weights actually used (name + content hash + backend), so saved
+        detections can be invalidated when the model is retrained.
+        """
+        name = os.path.basename(model_path)
+        suffix = "" if backend == "torch" else f"/{backend}"
+        if not os.path.isfile(model_path):
+            return name + suffix
+        h = hashlib.sha1()
+        with open(model_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return f"{name}@{h.hexdigest()[:12]}{suffix}"
+
+    def predict(self, image_path_or_array):
+        """Raw inference on one image, without logging. Same output format as detect_particles."""
+        if self.runtime is not None:
+            image = image_path_or_array
+            if isinstance(image, str):
+                image = cv2.imread(image)
+            return self.runtime.predict(image)
+
+        results = self.model(image_path_or_array, verbose=False)
+        detections = []
+        for result in results:
+            detections.extend(self._parse_result(result))
+        return detections
 
     def detect_particles(self, image_path_or_array):
         """
         Runs detection.
         Returns a list of dicts: {'x': center_x, 'y': center_y, 'w': width, 'h': height, 'conf': confidence}
         """
-        if self.model is None:
+        if not self.ready:
             print("[AI] No model loaded. Returning empty detections.")
             return []
 
         # Run inference
-        results = self.model(image_path_or_array, verbose=False) 
-        
-        detections = []
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                # box.xywh returns center_x, center_y, width, height
-                x, y, w, h = box.xywh[0].cpu().numpy()
-                conf = float(box.conf[0].cpu().numpy())
-                
-                # For this specific project, if we are using an untrained model on synthetic blobs,
-                # it might not detect anything. 
-                # To verify the workflow, if confidence is very low, we might skip.
-                # But typically we trust the model output.
-                
-                detections.append({
-                    'x': float(x),
-                    'y': float(y),
-                    'w': float(w),
-                    'h': float(h),
-                    'conf': conf
-                })
+        detections = self.predict(image_path_or_array)
         
         print(f"[AI] Detected {len(detections)} objects.")
         return detections
 
-    def detect_blobs_fallback(self, image):
+    def detect_batch(self, images):
+        """
+        Batched inference over a list of images (paths or arrays).
+        Returns one detection list per input image, in the same order.
+        """
+        if not self.ready:
+            print("[AI] No model loaded. Returning empty detections.")
+            return [[] for _ in images]
+        if not images:
+            return []
+
+        if self.runtime is not None:
+            batch = self.runtime.predict_batch([cv2.imread(i) if isinstance(i, str) else i for i in images])
+        else:
+            results = self.model(list(images), verbose=False)
+            batch = [self._parse_result(r) for r in results]
+        
+        print(f"[AI] Batch of {len(images)} images: {sum(len(d) for d in batch)} objects.")
+        return batch
+
+    def _parse_result(self, result):
+        detections = []
+        for box in result.boxes:
+            # box.xywh returns center_x, center_y, width, height
+            x, y, w, h = box.xywh[0].cpu().numpy()
+            conf = float(box.conf[0].cpu().numpy())
+            
+            # For this specific project, if we are using an untrained model on synthetic blobs,
+            # it might not detect anything. 
+            # To verify the workflow, if confidence is very low, we might skip.
+            # But typically we trust the model output.
+            
+            detections.append({
+                'x': float(x),
+                'y': float(y),
+                'w': float(w),
+                'h': float(h),
+                'conf': conf
+            })
+        return detections
+
+    @staticmethod
+    def detect_blobs_fallback(image):
         """
         Fallback using simple CV2 blob detection for simulation if YOLO Model is not yet trained.
         """
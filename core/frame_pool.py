@@ -0,0 +1,104 @@
+import threading
+import numpy as np
+
+
+class FrameBuffer:
+    """
+    A frame borrowed from a FramePool. The array stays valid until release();
+    use it as a context manager to make the lifetime explicit:
+
+        with pool.acquire() as frame:
+            adapter.acquire_image(out=frame.array)
+            ...
+    """
+
+    def __init__(self, pool, array, pooled):
+        self.pool = pool
+        self.array = array
+        self.pooled = pooled
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.pool._give_back(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class FramePool:
+    """
+    Fixed number of preallocated frame buffers shared by acquisition, detection
+    and saving. Buffers are created lazily up to `size`; when all are borrowed,
+    a transient (non-pooled) buffer is handed out and counted as overflow, so a
+    caller never blocks but an undersized pool shows up in the statistics.
+    """
+
+    def __init__(self, shape=(1024, 1024, 3), dtype=np.uint8, size=4):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.size = size
+        self._free = []
+        self._lock = threading.Lock()
+        self._stats = {'acquires': 0, 'reuses': 0, 'allocations': 0, 'overflow': 0,
+                       'in_use': 0, 'peak_in_use': 0}
+
+    @property
+    def frame_bytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def acquire(self, shape=None, dtype=None):
+        shape = self.shape if shape is None else tuple(shape)
+        dtype = self.dtype if dtype is None else np.dtype(dtype)
+        with self._lock:
+            self._stats['acquires'] += 1
+            self._stats['in_use'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._stats['in_use'])
+
+            if shape != self.shape or dtype != self.dtype:
+                # Foreign geometry (e.g. a different scan resolution): not pooled
+                self._stats['overflow'] += 1
+                return FrameBuffer(self, np.empty(shape, dtype=dtype), pooled=False)
+            if self._free:
+                self._stats['reuses'] += 1
+                return FrameBuffer(self, self._free.pop(), pooled=True)
+            if self._stats['allocations'] < self.size:
+                self._stats['allocations'] += 1
+                return FrameBuffer(self, np.empty(self.shape, dtype=self.dtype), pooled=True)
+            self._stats['overflow'] += 1
+            return FrameBuffer(self, np.empty(self.shape, dtype=self.dtype), pooled=False)
+
+    def reserve(self, size):
+        """Raises the capacity to at least `size` buffers (for callers that hold many frames at once)."""
+        with self._lock:
+            self.size = max(self.size, size)
+
+    def wrap(self, array):
+        """Tracks an externally allocated frame (e.g. an adapter that could not fill in place)."""
+        with self._lock:
+            self._stats['acquires'] += 1
+            self._stats['overflow'] += 1
+            self._stats['in_use'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._stats['in_use'])
+        return FrameBuffer(self, array, pooled=False)
+
+    def _give_back(self, buf):
+        with self._lock:
+            self._stats['in_use'] -= 1
+            if buf.pooled:
+                self._free.append(buf.array)
+        buf.array = None
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+        out['capacity'] = self.size
+        out['pooled_bytes'] = out['allocations'] * self.frame_bytes
+        out['peak_bytes'] = out['peak_in_use'] * self.frame_bytes
+        out['reuse_rate'] = out['reuses'] / out['acquires'] if out['acquires'] else 0.0
+        return out
@@ -0,0 +1,235 @@
+import os
+import glob
+import time
+import cv2
+import numpy as np
+
+# torch      : ultralytics + PyTorch (original path, slowest on CPU)
+# onnx       : exported ONNX model on ONNX Runtime (CPU)
+# onnx-int8  : ONNX model with dynamic INT8 weight quantization
+# openvino   : ONNX model on ONNX Runtime's OpenVINO execution provider (Intel CPUs)
+BACKENDS = ("torch", "onnx", "onnx-int8", "openvino")
+
+
+def exported_path(model_path, backend):
+    """Cache location of the converted model, next to the .pt file."""
+    stem = os.path.splitext(model_path)[0]
+    if backend == "onnx-int8":
+        return stem + ".int8.onnx"
+    return stem + ".onnx"
+
+
+def _is_fresh(path, source):
+    if not os.path.exists(path):
+        return False
+    return not os.path.exists(source) or os.path.getmtime(path) >= os.path.getmtime(source)
+
+
+def export_model(model_path, backend, imgsz=640, force=False):
+    """
+    One-time conversion of a .pt model for a CPU backend. The result is cached
+    next to the .pt and reused until the .pt is newer (e.g. after retraining).
+    Returns the path of the converted model.
+    """
+    if backend == "torch":
+        return model_path
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Choose from {BACKENDS}")
+    if model_path.endswith(".onnx"):
+        # Already exported; only quantization may still be needed
+        onnx_path = model_path
+    else:
+        onnx_path = exported_path(model_path, "onnx")
+        if force or not _is_fresh(onnx_path, model_path):
+            from ultralytics import YOLO
+            print(f"[AI] Exporting {model_path} -> ONNX (imgsz={imgsz})...")
+            out = YOLO(model_path).export(format="onnx", imgsz=imgsz, dynamic=False)
+            if os.path.abspath(out) != os.path.abspath(onnx_path):
+                os.replace(out, onnx_path)
+
+    if backend != "onnx-int8":
+        return onnx_path
+
+    int8_path = exported_path(onnx_path, "onnx-int8")
+    if force or not _is_fresh(int8_path, onnx_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        print(f"[AI] Quantizing {onnx_path} -> INT8...")
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+    return int8_path
+
+
+class OnnxRuntimeBackend:
+    """
+    Runs an exported YOLOv8 detection model with ONNX Runtime.
+    Pre/post-processing (letterbox, decode, NMS) is plain numpy/OpenCV so no
+    torch import is needed at all on the SEM PC.
+    """
+
+    def __init__(self, onnx_path, conf=0.25, iou=0.7, max_det=300, threads=None, openvino=False):
+        import onnxruntime as ort
+
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+
+        providers = ["CPUExecutionProvider"]
+        if openvino:
+            if "OpenVINOExecutionProvider" in ort.get_available_providers():
+                providers.insert(0, "OpenVINOExecutionProvider")
+            else:
+                print("[AI] OpenVINO execution provider not installed (onnxruntime-openvino). Using CPU provider.")
+
+        self.session = ort.InferenceSession(onnx_path, sess_options=opts, providers=providers)
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        # Static export: NCHW with fixed H, W
+        self.input_h = int(inp.shape[2]) if isinstance(inp.shape[2], int) else 640
+        self.input_w = int(inp.shape[3]) if isinstance(inp.shape[3], int) else 640
+
+    def _letterbox(self, image):
+        h, w = image.shape[:2]
+        r = min(self.input_h / h, self.input_w / w)
+        new_w, new_h = int(round(w * r)), int(round(h * r))
+        pad_x = (self.input_w - new_w) / 2
+        pad_y = (self.input_h - new_h) / 2
+
+        canvas = np.full((self.input_h, self.input_w, 3), 114, dtype=np.uint8)
+        left, top = int(round(pad_x - 0.1)), int(round(pad_y - 0.1))
+        canvas[top:top + new_h, left:left + new_w] = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        return canvas, r, left, top
+
+    def predict(self, image):
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        canvas, r, left, top = self._letterbox(image)
+        blob = cv2.dnn.blobFromImage(canvas, scalefactor=1 / 255.0, swapRB=True)  # BGR->RGB, HWC->NCHW
+
+        out = self.session.run(None, {self.input_name: blob})[0][0]  # (4 + nc, N)
+        out = out.T
+        scores = out[:, 4:].max(axis=1)
+        mask = scores >= self.conf
+        if not mask.any():
+            return []
+        boxes = out[mask, :4]
+        scores = scores[mask]
+
+        # xywh (letterbox px) -> original image px
+        boxes[:, 0] = (boxes[:, 0] - left) / r
+        boxes[:, 1] = (boxes[:, 1] - top) / r
+        boxes[:, 2] /= r
+        boxes[:, 3] /= r
+
+        tl_boxes = np.column_stack([boxes[:, 0] - boxes[:, 2] / 2, boxes[:, 1] - boxes[:, 3] / 2, boxes[:, 2], boxes[:, 3]])
+        keep = cv2.dnn.NMSBoxes(tl_boxes.tolist(), scores.tolist(), self.conf, self.iou)
+        keep = np.array(keep).reshape(-1)[:self.max_det]
+
+        return [{'x': float(boxes[i, 0]), 'y': float(boxes[i, 1]), 'w': float(boxes[i, 2]),
+                 'h': float(boxes[i, 3]), 'conf': float(scores[i])} for i in keep]
+
+    def predict_batch(self, images):
+        # The export is static batch=1; looping keeps memory flat and is what ORT does internally anyway
+        return [self.predict(img) for img in images]
+
+
+def load_simulator_images(results_dir="results", limit=20):
+    """
+    Overview frames saved by the simulator sessions, used as a fixed benchmark set.
+    Any saved format is accepted; when a frame exists in several formats the
+    lossless copy is used, so JPEG artifacts do not skew the accuracy check.
+    """
+    from core.reanalyzer import IMAGE_EXTS, find_overview_images
+    lossless_first = {ext: 0 if ext in (".png", ".tif", ".tiff") else 1 for ext in IMAGE_EXTS}
+    best = {}
+    for session in sorted(glob.glob(os.path.join(results_dir, "Session_*"))):
+        for rel in find_overview_images(session):
+            stem, ext = os.path.splitext(os.path.join(session, rel))
+            rank = lossless_first[ext.lower()]
+            if stem not in best or rank < best[stem][0]:
+                best[stem] = (rank, stem + ext)
+    images = []
+    for stem in sorted(best)[:limit]:
+        img = cv2.imread(best[stem][1], cv2.IMREAD_UNCHANGED)
+        if img is None:
+            continue
+        if img.dtype != np.uint8:  # 16-bit TIFF -> 8-bit, as the detector expects
+            img = cv2.normalize(img, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        images.append(img)
+    return images
+
+
+def _match_rate(ref, dets, iou_thresh=0.5):
+    """Fraction of detections matched 1:1 (IoU >= thresh) between two result lists."""
+    if not ref and not dets:
+        return 1.0
+    used = set()
+    matched = 0
+    for a in ref:
+        best, best_iou = None, iou_thresh
+        for j, b in enumerate(dets):
+            if j in used:
+                continue
+            ix = max(0.0, min(a['x'] + a['w'] / 2, b['x'] + b['w'] / 2) - max(a['x'] - a['w'] / 2, b['x'] - b['w'] / 2))
+            iy = max(0.0, min(a['y'] + a['h'] / 2, b['y'] + b['h'] / 2) - max(a['y'] - a['h'] / 2, b['y'] - b['h'] / 2))
+            inter = ix * iy
+            union = a['w'] * a['h'] + b['w'] * b['h'] - inter
+            iou = inter / union if union > 0 else 0.0
+            if iou >= best_iou:
+                best, best_iou = j, iou
+        if best is not None:
+            used.add(best)
+            matched += 1
+    return matched / max(len(ref), len(dets))
+
+
+def benchmark_backends(model_path, backends=BACKENDS, results_dir="results", limit=20, warmup=2):
+    """
+    Latency per frame and detection agreement (vs. the torch backend) on the
+    simulator images. Prints a table and returns the rows.
+    """
+    from core.ai_engine import YOLODetector
+
+    images = load_simulator_images(results_dir, limit)
+    if not images:
+        print(f"[Benchmark] No simulator images found under {results_dir}/Session_*.")
+        return []
+    print(f"[Benchmark] {len(images)} frames, backends: {', '.join(backends)}")
+
+    rows = []
+    reference = None
+    for backend in backends:
+        try:
+            det = YOLODetector(model_path=model_path, backend=backend)
+        except Exception as e:
+            print(f"[Benchmark] {backend}: unavailable ({e})")
+            continue
+        if not det.ready:
+            print(f"[Benchmark] {backend}: model failed to load, skipped.")
+            continue
+
+        for img in images[:warmup]:
+            det.predict(img)
+        latencies = []
+        results = []
+        for img in images:
+            t0 = time.perf_counter()
+            results.append(det.predict(img))
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+        if reference is None:
+            reference = results
+        agreement = float(np.mean([_match_rate(r, d) for r, d in zip(reference, results)]))
+        lat = np.array(latencies)
+        rows.append({'backend': backend, 'mean_ms': float(lat.mean()), 'p95_ms': float(np.percentile(lat, 95)),
+                     'detections': sum(len(r) for r in results), 'agreement': agreement})
+
+    print(f"{'backend':<10} {'mean ms':>9} {'p95 ms':>9} {'dets':>6} {'agree':>7}")
+    for r in rows:
+        print(f"{r['backend']:<10} {r['mean_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['detections']:>6} {r['agreement']:>7.2%}")
+    return rows
@@ -0,0 +1,164 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+# Detection arrays crossing the process boundary: one row per box (x, y, w, h, conf), float32
+DET_FIELDS = ('x', 'y', 'w', 'h', 'conf')
+
+
+def _to_array(detections):
+    arr = np.empty((len(detections), len(DET_FIELDS)), dtype=np.float32)
+    for i, d in enumerate(detections):
+        arr[i] = [d[k] for k in DET_FIELDS]
+    return arr
+
+
+def _to_dicts(arr):
+    return [{k: float(v) for k, v in zip(DET_FIELDS, row)} for row in arr.tolist()]
+
+
+def _server_main(conn, shm_name, model_path, backend, threads):
+    """Inference process: attaches to the shared frame block and serves requests until 'stop'."""
+    from core.ai_engine import YOLODetector
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        detector = YOLODetector(model_path=model_path, backend=backend, threads=threads)
+        conn.send(('ready', detector.ready, detector.model_version))
+        while True:
+            try:
+                msg = conn.recv()
+            except EOFError:
+                break
+            if msg[0] == 'stop':
+                break
+            _, shape, dtype = msg
+            # Zero-copy view on the frame the client wrote into shared memory
+            frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+            try:
+                conn.send(('ok', _to_array(detector.predict(frame) if detector.ready else [])))
+            except Exception as e:
+                conn.send(('error', repr(e)))
+            del frame
+    finally:
+        shm.close()
+
+
+class RemoteDetector:
+    """
+    Runs YOLODetector in a separate process so inference does not hold the GIL of
+    the workflow / Tkinter process.
+
+    Frames go through a shared-memory block (the client copies the frame in once,
+    the server reads it in place - no pickling of arrays); only the small
+    (N, 5) float32 detection array comes back over the pipe. If the server dies
+    or stops answering it is restarted and the request retried once.
+
+    Drop-in replacement for YOLODetector inside AutomationManager.
+    """
+
+    def __init__(self, model_path="yolov8n.pt", backend="torch", threads=None,
+                 max_frame_bytes=4096 * 4096 * 3, timeout=60.0, start_timeout=300.0):
+        self.model_path = model_path
+        self.backend = backend
+        self.threads = threads
+        self.max_frame_bytes = max_frame_bytes
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.restarts = 0
+        self.model_version = None
+        self.ready = False
+        self._closed = False
+
+        self._ctx = mp.get_context("spawn")  # fresh interpreter: no inherited Tk / threads
+        self._shm = shared_memory.SharedMemory(create=True, size=max_frame_bytes)
+        self._proc = None
+        self._conn = None
+        self._start()
+
+    def _start(self):
+        parent, child = self._ctx.Pipe()
+        self._proc = self._ctx.Process(
+            target=_server_main, args=(child, self._shm.name, self.model_path, self.backend, self.threads),
+            daemon=True, name="inference-server")
+        self._proc.start()
+        child.close()
+        self._conn = parent
+        print(f"[AI] Inference server started (pid {self._proc.pid}).")
+
+        if not self._conn.poll(self.start_timeout):
+            raise RuntimeError("Inference server did not start in time")
+        _, self.ready, self.model_version = self._conn.recv()
+
+    def _restart(self, reason):
+        self.restarts += 1
+        print(f"[AI] Inference server {reason}; restarting (#{self.restarts})...")
+        self._kill()
+        self._start()
+
+    def _kill(self):
+        if self._proc is not None and self._proc.is_alive():
+            self._proc.terminate()
+            self._proc.join(5)
+        if self._conn is not None:
+            self._conn.close()
+
+    def _request(self, frame):
+        self._conn.send(('detect', frame.shape, frame.dtype.str))
+        if not self._conn.poll(self.timeout):
+            raise TimeoutError("no reply")
+        status, payload = self._conn.recv()
+        if status != 'ok':
+            raise RuntimeError(payload)
+        return payload
+
+    def predict(self, image):
+        image = np.ascontiguousarray(image)
+        if image.nbytes > self.max_frame_bytes:
+            raise ValueError(f"Frame of {image.nbytes} bytes exceeds the shared block ({self.max_frame_bytes})")
+        np.ndarray(image.shape, dtype=image.dtype, buffer=self._shm.buf)[...] = image
+
+        for attempt in range(2):
+            try:
+                return _to_dicts(self._request(image))
+            except (EOFError, BrokenPipeError, ConnectionResetError, TimeoutError, OSError) as e:
+                if attempt == 1:
+                    raise
+                self._restart(f"unavailable ({type(e).__name__})")
+
+    def detect_particles(self, image):
+        if not self.ready:
+            print("[AI] No model loaded. Returning empty detections.")
+            return []
+        detections = self.predict(image)
+        print(f"[AI] Detected {len(detections)} objects.")
+        return detections
+
+    def detect_batch(self, images):
+        return [self.predict(img) if self.ready else [] for img in images]
+
+    def detect_blobs_fallback(self, image):
+        # Cheap OpenCV path - no reason to cross the process boundary
+        from core.ai_engine import YOLODetector
+        return YOLODetector.detect_blobs_fallback(image)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._conn is not None:
+            try:
+                self._conn.send(('stop',))
+            except (BrokenPipeError, OSError):
+                pass
+        if self._proc is not None:
+            self._proc.join(5)
+        self._kill()
+        self._shm.close()
+        self._shm.unlink()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -1,102 +1,457 @@
 import time
 import numpy as np
 import cv2
+from .stage_settle import StageSettler
+from .frame_pool import FramePool
+from .run_planner import OperationLog, scan_profile
+
+# Per-instrument settle-time calibration (written by MicroscopeController.calibrate_settle)
+SETTLE_CALIBRATION_FILE = "settle_calibration_{}.json"
 
 class MicroscopeController:
-    def __init__(self, simulation=False):
+    """
+    Front-end for the adapters. Keeps the last known instrument state
+    (magnification, stage position, focus) and skips commands that would not
+    change anything, so no-op calls do not pay the adapter's settle waits or an
+    SDK round trip. State is dropped on any adapter error, and stage reads that
+    disagree with the cache are treated as an external change (joystick, operator).
+
+    The stage cache holds the settled readback, not the commanded point (a real
+    stage lands a few um off), plus the last command: a move is a no-op when it
+    repeats that command and the stage still reads back where it settled.
+    """
+
+    COMMANDS = ("set_magnification", "move_stage", "auto_focus")
+
+    def __init__(self, simulation=False, sim_options=None, pos_tol=None, mag_rel_tol=1e-3, verify_elided_moves=True,
+                 frame_pool_size=4):
         self.simulation = simulation
         if self.simulation:
-            self.adapter = MockAdapter()
+            # sim_options: MockAdapter keyword arguments (n_particles, seed, timings, ...)
+            self.adapter = MockAdapter(**(sim_options or {}))
         else:
             self.adapter = RealAdapter()
 
+        # stage units (mm); default: 2x the adapter's settle tolerance (readback jitter of a settled stage)
+        settler = getattr(self.adapter, 'settler', None)
+        self.pos_tol = pos_tol if pos_tol is not None else 2 * getattr(settler, 'tol', 5e-4)
+        self.mag_rel_tol = mag_rel_tol      # relative
+        self.verify_elided_moves = verify_elided_moves  # cheap position read before skipping a move
+        self.sent = {c: 0 for c in self.COMMANDS}
+        self.elided = {c: 0 for c in self.COMMANDS}
+        self.external_changes = 0
+        self.invalidate()
+
+        # Measured duration of every command sent (learned by the run planner's CostModel)
+        self.op_log = OperationLog(getattr(self.adapter, 'instrument_name', None))
+
+        # Preallocated frames shared by acquisition -> detection -> saving
+        sc = getattr(self.adapter, 'scan_settings', {})
+        self.frame_pool_size = frame_pool_size  # working frames; callers holding more frames reserve() extra
+        self.frame_pool = FramePool(shape=(sc.get('height', 1024), sc.get('width', 1024), 3), size=frame_pool_size)
+
+    def invalidate(self):
+        """Forget everything about the instrument state (next commands are always sent)."""
+        self._mag = None
+        self._pos = None    # settled readback
+        self._cmd = None    # last commanded position
+        self._focus = None  # (x, y, mag) at the last successful auto-focus
+
+    def _send(self, command, *args):
+        key = self._op_key(command, args)
+        t0 = time.perf_counter()
+        try:
+            result = getattr(self.adapter, command)(*args)
+        except Exception:
+            self.invalidate()
+            raise
+        self.op_log.record(command, time.perf_counter() - t0, key)
+        self.sent[command] += 1
+        return result
+
+    def _op_key(self, command, args):
+        """What the duration of a command depends on (from the cached state before it runs)."""
+        if command == 'move_stage':
+            pos = self._pos
+            if pos is None:
+                try:
+                    pos = self.adapter.get_stage_position()
+                except Exception:
+                    return None
+            return float(np.hypot(args[0] - pos[0], args[1] - pos[1]))
+        if command == 'set_magnification':
+            return float(abs(np.log10(args[0] / self._mag))) if self._mag else None
+        if command == 'auto_focus':
+            return self._mag
+        return None
+
+    def _same_pos(self, a, b):
+        return a is not None and b is not None and abs(a[0] - b[0]) <= self.pos_tol and abs(a[1] - b[1]) <= self.pos_tol
+
     def connect(self):
         print("[Microscope] Connecting...")
+        self.invalidate()
         self.adapter.connect()
 
     def set_magnification(self, mag):
+        if self._mag is not None and abs(mag - self._mag) <= self.mag_rel_tol * self._mag:
+            self.elided['set_magnification'] += 1
+            print(f"[Microscope] Magnification already x{mag} (skipped)")
+            return
         print(f"[Microscope] Setting magnification to x{mag}")
-        self.adapter.set_magnification(mag)
+        self._send('set_magnification', mag)
+        self._mag = mag
+        self._focus = None
 
     def move_stage(self, x, y):
+        if self._pos is not None and self._same_pos(self._cmd, (x, y)):
+            settled = self._pos
+            if not self.verify_elided_moves or self._same_pos(self.get_stage_position(), settled):
+                self.elided['move_stage'] += 1
+                print(f"[Microscope] Stage already at X={x}, Y={y} (skipped)")
+                return
         print(f"[Microscope] Moving stage to X={x}, Y={y}")
-        self.adapter.move_stage(x, y)
+        self._send('move_stage', x, y)
+        self._cmd = (x, y)
+        self._focus = None
+        try:
+            self._pos = tuple(self.adapter.get_stage_position())
+        except Exception:
+            self.invalidate()
+            raise
 
     def auto_focus(self):
+        if self._focus is not None and self._pos is not None and self._mag is not None \
+                and self._same_pos(self._focus[:2], self._pos) and self._focus[2] == self._mag:
+            self.elided['auto_focus'] += 1
+            print("[Microscope] Already focused here at this magnification (skipped)")
+            return
         print("[Microscope] Performing Auto-Focus...")
-        self.adapter.auto_focus()
+        self._send('auto_focus')
+        if self._pos is not None and self._mag is not None:
+            self._focus = (self._pos[0], self._pos[1], self._mag)
 
     def acquire_image(self):
         print("[Microscope] Acquiring image...")
-        return self.adapter.acquire_image()
+        t0 = time.perf_counter()
+        try:
+            img = self.adapter.acquire_image()
+        except Exception:
+            self.invalidate()
+            raise
+        self._record_scan(t0)
+        return img
+
+    def acquire_frame(self):
+        """
+        Like acquire_image, but the adapter scans straight into a pooled buffer.
+        The caller owns the returned FrameBuffer and must release() it (or use `with`).
+        """
+        print("[Microscope] Acquiring image...")
+        buf = self.frame_pool.acquire()
+        t0 = time.perf_counter()
+        try:
+            img = self.adapter.acquire_image(out=buf.array)
+        except Exception:
+            buf.release()
+            self.invalidate()
+            raise
+        self._record_scan(t0)
+        if img is not buf.array:
+            # Adapter could not fill in place (different geometry) - hand out its array instead
+            buf.release()
+            return self.frame_pool.wrap(img)
+        return buf
+
+    def _record_scan(self, t0):
+        self.op_log.record('scan', time.perf_counter() - t0, scan_profile(getattr(self.adapter, 'scan_settings', {})))
 
     def get_stage_position(self):
-        return self.adapter.get_stage_position()
+        try:
+            pos = self.adapter.get_stage_position()
+        except Exception:
+            self.invalidate()
+            raise
+        if self._pos is not None and not self._same_pos(self._pos, pos):
+            # Someone moved the stage behind our back
+            self.external_changes += 1
+            print(f"[Microscope] Stage moved externally: cached {self._pos}, actual {pos}")
+            self._focus = None
+            self._cmd = None
+        self._pos = tuple(pos)
+        return pos
 
-class MockAdapter:
-    def __init__(self):
-        self.x = 0
-        self.y = 0
-        self.mag = 500
-        # Canvas size for simulation (World space)
-        self.world_size = 2000 
-        self.particles = [
+    def calibrate_settle(self, origin=None, distances=(0.002, 0.02, 0.2, 1.0, 5.0, 10.0)):
+        """
+        Builds the settle-time vs. distance model for this instrument and saves it,
+        so later moves poll with a distance-aware first wait and timeout.
+        Moves along +X from `origin` (default: current position) and back.
+        """
+        if origin is None:
+            origin = self.adapter.get_stage_position()
+        self.invalidate()
+        path = SETTLE_CALIBRATION_FILE.format(self.adapter.instrument_name)
+        return self.adapter.settler.calibrate(self.adapter, origin, distances, save_path=path)
+
+    def acquisition_metadata(self):
+        """Instrument state to store with a captured frame (from the cached state, no SDK calls)."""
+        return {
+            'stage_x': self._pos[0] if self._pos else None,
+            'stage_y': self._pos[1] if self._pos else None,
+            'magnification': self._mag,
+            'field_of_view_um': 200000 / self._mag if self._mag else None,
+            'focused': self._focus is not None,
+            'scan': dict(getattr(self.adapter, 'scan_settings', {})),
+        }
+
+    def command_summary(self):
+        return {
+            'sent': dict(self.sent),
+            'elided': dict(self.elided),
+            'elided_total': sum(self.elided.values()),
+            'external_changes': self.external_changes,
+        }
+
+class ParticleWorld:
+    """
+    Simulated sample surface: particle centres and radii in world units (um).
+
+    Particles are bucketed into a uniform grid stored CSR-style (sorted by cell,
+    plus per-cell start offsets), so a view query only touches the cells under
+    the field of view instead of every particle on the sample.
+    """
+
+    def __init__(self, xs, ys, radii, world_size, cells_per_side=None):
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        radii = np.asarray(radii, dtype=np.float64)
+        self.world_size = float(world_size)
+        # ~4 particles per cell on average, at most 4096 x 4096 cells
+        n = cells_per_side or int(np.clip(np.sqrt(max(len(xs), 1) / 4), 1, 4096))
+        self.cells_per_side = n
+        self.cell_size = self.world_size / n
+        self.max_radius = float(radii.max()) if len(radii) else 0.0
+
+        cell_ids = self._cell_of(xs, ys)
+        order = np.argsort(cell_ids, kind="stable")
+        self.xs, self.ys, self.radii = xs[order], ys[order], radii[order]
+        self.cell_start = np.searchsorted(cell_ids[order], np.arange(n * n + 1))
+
+    def __len__(self):
+        return len(self.xs)
+
+    def _cell_index(self, v):
+        return np.clip((np.asarray(v) // self.cell_size).astype(np.int64), 0, self.cells_per_side - 1)
+
+    def _cell_of(self, xs, ys):
+        return self._cell_index(ys) * self.cells_per_side + self._cell_index(xs)
+
+    def query(self, x_min, y_min, x_max, y_max):
+        """Indices of particles whose disc overlaps the rectangle."""
+        pad = self.max_radius
+        cx0, cx1 = self._cell_index([x_min - pad, x_max + pad])
+        cy0, cy1 = self._cell_index([y_min - pad, y_max + pad])
+        n = self.cells_per_side
+
+        # Each grid row is one contiguous slice of the sorted arrays
+        chunks = [np.arange(self.cell_start[cy * n + cx0], self.cell_start[cy * n + cx1 + 1])
+                  for cy in range(int(cy0), int(cy1) + 1)]
+        idx = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+        if idx.size == 0:
+            return idx
+
+        xs, ys, r = self.xs[idx], self.ys[idx], self.radii[idx]
+        inside = (xs + r > x_min) & (xs - r < x_max) & (ys + r > y_min) & (ys - r < y_max)
+        return idx[inside]
+
+    @classmethod
+    def generate(cls, n_particles, world_size=None, seed=0, size_median=8.0, size_sigma=0.4, cluster_fraction=0.3,
+                 coverage=0.12):
+        """
+        Procedural sample: uniformly scattered particles plus a fraction placed in
+        Gaussian clusters (agglomerates). Radii are log-normal around size_median.
+        world_size=None sizes the sample so the particles cover about `coverage`
+        of its area, keeping overviews usable from a few hundred to 100k+ particles.
+        """
+        if world_size is None:
+            mean_area = np.pi * size_median ** 2 * np.exp(2 * size_sigma ** 2)  # E[pi r^2], log-normal r
+            world_size = float(np.sqrt(max(n_particles, 1) * mean_area / coverage))
+        rng = np.random.default_rng(seed)
+        n_cluster = int(n_particles * cluster_fraction)
+        n_uniform = n_particles - n_cluster
+
+        xs = [rng.uniform(0, world_size, n_uniform)]
+        ys = [rng.uniform(0, world_size, n_uniform)]
+        if n_cluster:
+            n_centres = max(1, n_cluster // 20)
+            centres = rng.uniform(0, world_size, (n_centres, 2))
+            pick = rng.integers(0, n_centres, n_cluster)
+            spread = size_median * 6
+            xs.append(centres[pick, 0] + rng.normal(0, spread, n_cluster))
+            ys.append(centres[pick, 1] + rng.normal(0, spread, n_cluster))
+
+        xs = np.clip(np.concatenate(xs), 0, world_size)
+        ys = np.clip(np.concatenate(ys), 0, world_size)
+        radii = rng.lognormal(np.log(size_median), size_sigma, n_particles)
+        return cls(xs, ys, radii, world_size)
+
+    @classmethod
+    def legacy(cls):
+        """The original nine hand-placed particles (30 px radius at x500)."""
+        pts = [
             (1000, 1000), (950, 950), (1050, 1020), # Center cluster
             (200, 200), (300, 250),                 # Top-left cluster
             (1800, 1800), (1750, 1850),             # Bottom-right cluster
             (500, 1500), (1500, 500)                # Scattered
         ]
+        xs, ys = zip(*pts)
+        return cls(xs, ys, [12.0] * len(pts), world_size=2000)
+
+
+class MockAdapter:
+    """
+    Virtual SEM for simulation and stress tests.
+
+    n_particles=None keeps the original nine-particle layout; otherwise a world
+    of n_particles is generated from `seed` (world_size=None: scaled to the
+    particle count). Timing of each operation can be set to 0 for fast stress runs;
+    non-default timings change the instrument name (e.g. "mock-t0_0_0_0"), so the
+    run planner never learns the normal simulator's durations from such sessions.
+
+    The stage works in mm like the real one, the world in um. Each entry of
+    sample_centres (stage mm, e.g. the slot coordinates) holds a copy of the
+    world centred on it; the view shows the sample nearest to the stage.
+    """
+
+    def __init__(self, n_particles=None, seed=0, world_size=None, size_median=8.0, size_sigma=0.4,
+                 resolution=1024, noise_pool_size=8, sample_centres=None,
+                 move_time=1.0, mag_time=0.5, af_time=1.0, scan_time=2.0, move_speed=100.0):
+        timings = (move_time, mag_time, af_time, scan_time)
+        self.instrument_name = "mock" if timings == (1.0, 0.5, 1.0, 2.0) else "mock-t" + "_".join(f"{t:g}" for t in timings)
+        self.scan_settings = {'detector': "Simulated", 'width': resolution, 'height': resolution, 'bit_depth': 8}
+        self.x = 0
+        self.y = 0
+        self.mag = 500
+        self.focus_mag = None  # magnification at the last auto-focus
+        self.resolution = resolution
+        self.move_time = move_time
+        self.mag_time = mag_time
+        self.af_time = af_time
+        self.scan_time = scan_time
+        # Stage dynamics: travel time = 30% of move_time + distance / move_speed (0 when move_time is 0)
+        self.move_speed = move_speed
+        self._motion = None  # (x0, y0, x1, y1, t_start, duration)
+        self.settler = StageSettler(tol=1e-4, poll_interval=0.02)
+        self.settler.load_model(SETTLE_CALIBRATION_FILE.format(self.instrument_name))
+
+        if n_particles is None:
+            self.world = ParticleWorld.legacy()
+        else:
+            self.world = ParticleWorld.generate(n_particles, world_size, seed, size_median, size_sigma)
+        # Canvas size for simulation (World space, um)
+        self.world_size = self.world.world_size
+        self.sample_centres = np.asarray(sample_centres if sample_centres else [(0.0, 0.0)], dtype=np.float64)
+
+        # Background noise is generated once; each frame crops a random window of a random pool entry
+        self._rng = np.random.default_rng(seed)
+        self._noise_margin = 64
+        pool_side = resolution + self._noise_margin
+        self._noise_pool = self._rng.integers(0, 50, (noise_pool_size, pool_side, pool_side), dtype=np.uint8)
+        self._gray = np.empty((resolution, resolution), dtype=np.uint8)  # render scratch, reused every frame
 
     def connect(self):
-        print("[MockAdapter] Connected to Virtual SEM.")
+        print(f"[MockAdapter] Connected to Virtual SEM ({len(self.world)} particles).")
 
     def set_magnification(self, mag):
         self.mag = mag
-        time.sleep(0.5)
+        time.sleep(self.mag_time)
 
-    def move_stage(self, x, y):
+    def command_move(self, x, y):
+        """Starts the (simulated) stage motion without waiting for it."""
+        x0, y0 = self.get_stage_position()
+        distance = float(np.hypot(x - x0, y - y0))
+        duration = 0.0 if self.move_time <= 0 else 0.3 * self.move_time + distance / self.move_speed
+        self._motion = (x0, y0, x, y, time.perf_counter(), duration)
         self.x = x
         self.y = y
-        time.sleep(1) # Simulate movement time
+        return distance
+
+    def move_stage(self, x, y):
+        distance = self.command_move(x, y)
+        if self._motion[5] > 0:
+            self.settler.wait(self.get_stage_position, target=(x, y), distance=distance) # Simulate movement time
 
     def get_stage_position(self):
+        if self._motion is not None:
+            x0, y0, x1, y1, t0, duration = self._motion
+            f = 1.0 if duration <= 0 else min(1.0, (time.perf_counter() - t0) / duration)
+            if f < 1.0:
+                f = f * f * (3 - 2 * f)  # smooth accel / decel
+                return x0 + (x1 - x0) * f, y0 + (y1 - y0) * f
+            self._motion = None
         return self.x, self.y
 
+    def _view_centre(self):
+        """Stage position (mm) -> world position (um) on the nearest sample."""
+        d = np.hypot(self.sample_centres[:, 0] - self.x, self.sample_centres[:, 1] - self.y)
+        cx, cy = self.sample_centres[int(np.argmin(d))]
+        return self.world_size / 2 + (self.x - cx) * 1000.0, self.world_size / 2 + (self.y - cy) * 1000.0
+
     def auto_focus(self):
-        time.sleep(1) # Simulate AF
+        self.focus_mag = self.mag
+        time.sleep(self.af_time) # Simulate AF
 
-    def acquire_image(self):
-        # Generate a synthetic image based on current position and mag
-        height, width = 1024, 1024
-        img = np.zeros((height, width, 3), dtype=np.uint8)
-        
-        # Draw background noise
-        noise = np.random.randint(0, 50, (height, width, 3), dtype=np.uint8)
-        img = cv2.add(img, noise)
+    def _blur_sigma_px(self):
+        """
+        Defocus blur in pixels. Zooming in past the magnification that was last
+        focused magnifies the residual defocus; never focused is worst.
+        """
+        if self.focus_mag is None:
+            return 0.5 + 1.5 * np.log2(max(self.mag, 500) / 500.0 + 1)
+        if self.mag <= self.focus_mag:
+            return 0.0
+        return 1.2 * (self.mag / self.focus_mag - 1.0)
+
+    def acquire_image(self, out=None):
+        """
+        Generate a synthetic image based on current position and mag.
+        out: optional (H, W, 3) uint8 buffer to render into (no allocation).
+        """
+        height = width = self.resolution
+
+        # Draw background noise (view into the pre-generated pool, copied once into the scratch buffer)
+        k = self._rng.integers(0, len(self._noise_pool))
+        ox, oy = self._rng.integers(0, self._noise_margin + 1, 2)
+        gray = self._gray
+        np.copyto(gray, self._noise_pool[k, oy:oy + height, ox:ox + width])
 
         # Draw particles if they are in view
-        fov_size = 200000 / self.mag # Simple relationship between mag and FOV
+        fov_size = 200000 / self.mag # Simple relationship between mag and FOV (um)
+        px_per_unit = width / fov_size
         
-        # Current view bounds (centered on x, y)
-        view_x_min = self.x - fov_size / 2
-        view_x_max = self.x + fov_size / 2
-        view_y_min = self.y - fov_size / 2
-        view_y_max = self.y + fov_size / 2
-
-        for px, py in self.particles:
-            if view_x_min < px < view_x_max and view_y_min < py < view_y_max:
-                # Map world coordinate to image coordinate
-                # normalized 0-1
-                norm_x = (px - view_x_min) / fov_size
-                norm_y = (py - view_y_min) / fov_size
-                
-                screen_x = int(norm_x * width)
-                screen_y = int(norm_y * height)
-                
-                # Draw particle (white circle)
-                cv2.circle(img, (screen_x, screen_y), 30, (255, 255, 255), -1)
-                
-        time.sleep(2) # Simulate scan time
+        # Current view bounds (centered on the stage position, in world um)
+        view_x, view_y = self._view_centre()
+        view_x_min = view_x - fov_size / 2
+        view_y_min = view_y - fov_size / 2
+
+        visible = self.world.query(view_x_min, view_y_min, view_x_min + fov_size, view_y_min + fov_size)
+        if visible.size:
+            sx = ((self.world.xs[visible] - view_x_min) * px_per_unit).astype(np.int64)
+            sy = ((self.world.ys[visible] - view_y_min) * px_per_unit).astype(np.int64)
+            sr = np.maximum(1, (self.world.radii[visible] * px_per_unit).astype(np.int64))
+            for cx, cy, r in zip(sx.tolist(), sy.tolist(), sr.tolist()):
+                # Draw particle (white circle); size scales with magnification
+                cv2.circle(gray, (cx, cy), r, 255, -1)
+
+        sigma = self._blur_sigma_px()
+        if sigma > 0.3:
+            cv2.GaussianBlur(gray, (0, 0), sigma, dst=gray)
+
+        if out is not None and out.shape == (height, width, 3) and out.dtype == np.uint8:
+            img = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR, dst=out)
+        else:
+            img = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        time.sleep(self.scan_time) # Simulate scan time
         return img
 
 import time
@@ -104,9 +459,18 @@ import cv2
 import os
 
 class RealAdapter:
-    def __init__(self):
+    def __init__(self, settle_image_check=False):
+        self.instrument_name = "real"
+        # acquire_image 인자와 동일하게 유지할 것 (메타데이터로 저장됨)
+        self.scan_settings = {'detector': "SE", 'bit_depth': 8, 'width': 1024, 'height': 1024, 'dwell': 10.0,
+                              'accumulation': 1, 'mode': "Frame"}
         self.atom = None 
         self.sem = None  
+        # 고정 sleep 대신 위치(및 선택적으로 이미지 이동량)가 안정될 때까지 폴링
+        self.settler = StageSettler(tol=0.0005, poll_interval=0.05, timeout=10.0)
+        self.settler.load_model(SETTLE_CALIBRATION_FILE.format(self.instrument_name))
+        self.focus_settler = StageSettler(tol=0.0002, poll_interval=0.1, timeout=3.0)
+        self.settle_image_check = settle_image_check
 
     def connect(self):
         try:
@@ -128,26 +492,52 @@ class RealAdapter:
         print(f"[Real] 배율 x{mag} 설정 (ViewField: {viewfield_mm:.4f} mm)")
         self.sem.Optics.SetViewfield(viewfield_mm)
 
+    def command_move(self, x, y):
+        self.sem.Stage.MoveTo(x, y)
+
     def move_stage(self, x, y):
         print(f"[Real] 스테이지 이동: X={x:.3f}, Y={y:.3f}")
-        self.sem.Stage.MoveTo(x, y)
-        time.sleep(0.5) # 진동 대기
+        x0, y0 = self.get_stage_position()
+        self.command_move(x, y)
+        # 진동 대기: 위치가 허용오차 안에서 안정될 때까지 (옵션: 저해상도 프레임 간 이동량도 확인)
+        elapsed = self.settler.wait(
+            self.get_stage_position, target=(x, y), distance=float(np.hypot(x - x0, y - y0)),
+            read_frame=self.acquire_preview if self.settle_image_check else None)
+        print(f"[Real] 스테이지 안정화: {elapsed:.2f}s")
 
     def auto_focus(self):
         print("[Real] 오토 포커스 실행...")
         self.sem.Optics.AutoFocus()
-        time.sleep(1.0) # 포커스 안정화 대기
+        # 포커스 안정화 대기: WD 읽기가 가능하면 안정될 때까지 폴링, 아니면 기존 고정 대기
+        get_wd = getattr(self.sem.Optics, "GetWD", None)
+        if get_wd is None:
+            time.sleep(1.0)
+        else:
+            self.focus_settler.wait(get_wd)
 
-    def acquire_image(self):
+    def acquire_preview(self):
+        """Fast 256x256 scan used for image-based settle checks."""
+        img_obj = self.sem.Scan.AcquireImage("SE", 8, 256, 256, 1.0, 1, "Frame")
+        temp_path = "temp_preview.tif"
+        img_obj.save(temp_path)
+        return cv2.imread(temp_path)
+
+    def acquire_image(self, out=None):
         print("[Real] 촬영 중...")
         # 1. Tescan 명령어로 촬영 (Detector='SE', 해상도=1024)
         # 인자 순서: Detector, BitDepth, Width, Height, DwellTime, Accumulation...
-        img_obj = self.sem.Scan.AcquireImage("SE", 8, 1024, 1024, 10.0, 1, "Frame")
+        sc = self.scan_settings
+        img_obj = self.sem.Scan.AcquireImage(sc['detector'], sc['bit_depth'], sc['width'], sc['height'],
+                                             sc['dwell'], sc['accumulation'], sc['mode'])
         
         # 2. 호환성을 위해 임시 저장 후 OpenCV로 다시 읽기
         temp_path = "temp_capture.tif"
         img_obj.save(temp_path)
         img_cv = cv2.imread(temp_path)
+        # 3. 풀 버퍼가 주어지면 그 안에 복사 (디코딩 자체의 할당은 SDK/파일 경유라 피할 수 없음)
+        if out is not None and img_cv is not None and out.shape == img_cv.shape and out.dtype == img_cv.dtype:
+            np.copyto(out, img_cv)
+            return out
         return img_cv
 
     def get_stage_position(self):
@@ -0,0 +1,189 @@
+import os
+import json
+import math
+import numpy as np
+
+STATS_FILENAME = "particle_stats.json"
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative accuracy (DDSketch-style log buckets).
+
+    Memory grows with the dynamic range of the data, not the number of values:
+    0.1 um .. 1 mm at 1% accuracy is < 500 buckets, regardless of particle count.
+    """
+
+    def __init__(self, rel_accuracy=0.01):
+        self.rel_accuracy = rel_accuracy
+        self.gamma = (1 + rel_accuracy) / (1 - rel_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        positive = values[values > 0]
+        self.zero_count += int(values.size - positive.size)
+        self.count += int(values.size)
+        if positive.size:
+            keys, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(np.int64), return_counts=True)
+            for k, c in zip(keys.tolist(), counts.tolist()):
+                self.buckets[k] = self.buckets.get(k, 0) + c
+
+    def merge(self, other):
+        if abs(other.gamma - self.gamma) > 1e-12:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for k, c in other.buckets.items():
+            self.buckets[k] = self.buckets.get(k, 0) + c
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if seen > rank:
+                # Bucket midpoint (in the relative-error sense)
+                return 2 * self.gamma ** k / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self):
+        return {'rel_accuracy': self.rel_accuracy, 'zero_count': self.zero_count, 'count': self.count,
+                'buckets': {str(k): c for k, c in sorted(self.buckets.items())}}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['rel_accuracy'])
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        sketch.buckets = {int(k): c for k, c in data['buckets'].items()}
+        return sketch
+
+
+class SizeStats:
+    """
+    Streaming aggregate of one size metric: count / mean / std / min / max,
+    quantiles via QuantileSketch and a fixed log-spaced histogram.
+    Batches are folded in with the parallel (Chan) update, so nothing per-particle is kept.
+    """
+
+    # 0.01 um .. 1000 um, 10 bins per decade
+    HIST_EDGES = np.round(10.0 ** np.arange(-2, 3.0001, 0.1), 6)
+    QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+    def __init__(self, rel_accuracy=0.01):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch(rel_accuracy)
+        self.hist = np.zeros(len(self.HIST_EDGES) - 1, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        n = int(values.size)
+        if n == 0:
+            return
+
+        b_mean = float(values.mean())
+        b_m2 = float(((values - b_mean) ** 2).sum())
+        self._combine(n, b_mean, b_m2)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        self.sketch.add_many(values)
+        self.hist += np.histogram(values, bins=self.HIST_EDGES)[0]
+        self.underflow += int((values < self.HIST_EDGES[0]).sum())
+        self.overflow += int((values > self.HIST_EDGES[-1]).sum())
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        self._combine(other.count, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+        self.hist += other.hist
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+
+    def _combine(self, n, mean, m2):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    def summary(self):
+        if self.count == 0:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'std': math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0,
+            'min': self.min,
+            'max': self.max,
+            'quantiles': {f"p{int(q * 100)}": self.sketch.quantile(q) for q in self.QUANTILES},
+            'histogram': {
+                'edges': self.HIST_EDGES.tolist(),
+                'counts': self.hist.tolist(),
+                'underflow': self.underflow,
+                'overflow': self.overflow,
+            },
+        }
+
+
+class ParticleStatsCollector:
+    """
+    Per-sample particle size statistics in physical units (um).
+
+    Detections are converted with the pixel scale of the frame they came from,
+    so frames at different magnifications (or mosaic tiles) can be mixed freely.
+    Metrics: equivalent diameter sqrt(w*h), width, height.
+    """
+
+    METRICS = ("diameter_um", "width_um", "height_um")
+
+    def __init__(self):
+        self.samples = {}
+
+    def add_detections(self, sample_name, detections, pixel_scale_um):
+        if not detections:
+            return
+        wh = np.array([[d['w'], d['h']] for d in detections], dtype=np.float64) * pixel_scale_um
+        stats = self.samples.setdefault(sample_name, {m: SizeStats() for m in self.METRICS})
+        stats['width_um'].add_many(wh[:, 0])
+        stats['height_um'].add_many(wh[:, 1])
+        stats['diameter_um'].add_many(np.sqrt(wh[:, 0] * wh[:, 1]))
+
+    def summary(self):
+        return {name: {m: s.summary() for m, s in stats.items()} for name, stats in self.samples.items()}
+
+    def describe(self, sample_name):
+        """One-line human summary for logs."""
+        stats = self.samples.get(sample_name)
+        if not stats or stats['diameter_um'].count == 0:
+            return f"[{sample_name}] No particles measured."
+        d = stats['diameter_um'].summary()
+        q = d['quantiles']
+        return (f"[{sample_name}] Size (eq. diameter, um): n={d['count']}, mean={d['mean']:.3f}, "
+                f"D10={q['p10']:.3f}, D50={q['p50']:.3f}, D90={q['p90']:.3f}")
+
+    def write(self, session_dir):
+        path = os.path.join(session_dir, STATS_FILENAME)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=1)
+        return path
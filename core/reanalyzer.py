@@ -0,0 +1,212 @@
+import os
+import json
+import glob
+import hashlib
+import threading
+import queue
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+
+RESULTS_FILENAME = "reanalysis_detections.json"
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".tif", ".tiff")
+
+# Per-process detector (created once by the pool initializer, reused for every batch)
+_WORKER_DETECTOR = None
+
+
+def find_overview_images(session_dir):
+    """Low-mag overview images of one session (LowMag*/ folders or LowMag*/Overview* files)."""
+    found = []
+    for root, _, files in os.walk(session_dir):
+        rel_root = os.path.relpath(root, session_dir)
+        in_lowmag = any(part.startswith("LowMag") for part in rel_root.split(os.sep))
+        for name in files:
+            if not name.lower().endswith(IMAGE_EXTS) or ".preview." in name:
+                continue
+            if in_lowmag or name.startswith(("LowMag", "Overview")):
+                found.append(os.path.normpath(os.path.join(rel_root, name)))
+    return sorted(found)
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_results(session_dir):
+    path = os.path.join(session_dir, RESULTS_FILENAME)
+    if not os.path.exists(path):
+        return {'images': {}}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[Reanalyze] Ignoring unreadable {path}: {e}")
+        return {'images': {}}
+
+
+def save_results(session_dir, data):
+    # Write to a temp file first so an interrupted run never leaves a half-written JSON
+    path = os.path.join(session_dir, RESULTS_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+class PrefetchReader:
+    """
+    Decodes images on a background thread, `depth` frames ahead of the consumer,
+    so disk I/O and JPEG decoding overlap with inference.
+    Iterating yields (path, image); image is None if the file could not be read.
+    """
+    _DONE = object()
+
+    def __init__(self, paths, depth=4):
+        self.paths = list(paths)
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def _worker(self):
+        for path in self.paths:
+            self._queue.put((path, cv2.imread(path)))
+        self._queue.put(self._DONE)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                return
+            yield item
+
+
+def _init_worker(model_path, backend, threads_per_worker):
+    global _WORKER_DETECTOR
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)  # avoid N workers x all cores oversubscription
+    except ImportError:
+        pass
+    from core.ai_engine import YOLODetector
+    _WORKER_DETECTOR = YOLODetector(model_path=model_path, backend=backend, threads=threads_per_worker)
+    if not _WORKER_DETECTOR.ready:
+        # Empty detections from a missing model would be stored as up-to-date results
+        raise RuntimeError(f"model {model_path} ({backend}) could not be loaded in the worker")
+
+
+def _analyze_chunk(paths, batch_size):
+    """Runs in a pool worker. Returns {path: detections or None (unreadable)}."""
+    out = {}
+    batch_paths, batch_imgs = [], []
+
+    def flush():
+        if batch_imgs:
+            for p, dets in zip(batch_paths, _WORKER_DETECTOR.detect_batch(batch_imgs)):
+                out[p] = dets
+            batch_paths.clear()
+            batch_imgs.clear()
+
+    for path, img in PrefetchReader(paths, depth=batch_size * 2):
+        if img is None:
+            out[path] = None
+            continue
+        batch_paths.append(path)
+        batch_imgs.append(img)
+        if len(batch_imgs) >= batch_size:
+            flush()
+    flush()
+    return out
+
+
+class SessionReanalyzer:
+    """
+    Offline re-detection over saved results/Session_* folders.
+
+    Work is incremental: an image is skipped when the stored entry has the same
+    file hash and model version. Results are written per session to
+    Session_*/reanalysis_detections.json.
+    """
+
+    def __init__(self, model_path="yolov8n.pt", workers=None, batch_size=8, chunk_size=32, backend="torch"):
+        self.model_path = model_path
+        self.backend = backend
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.batch_size = max(1, batch_size)
+        self.chunk_size = max(self.batch_size, chunk_size)
+
+        from core.ai_engine import YOLODetector
+        from core.inference_backends import export_model
+        self.model_version = YOLODetector._model_version(model_path, backend)
+        # Export once here, so pool workers only load the cached file
+        export_model(model_path, backend)
+
+    def run(self, results_dir="results", force=False):
+        sessions = sorted(d for d in glob.glob(os.path.join(results_dir, "Session_*")) if os.path.isdir(d))
+        print(f"[Reanalyze] {len(sessions)} sessions in {results_dir} (model: {self.model_version}, workers: {self.workers})")
+
+        # 1. Decide what needs work (hashing happens here, in the parent process)
+        pending = {}   # session_dir -> {abs_path: (rel_path, sha1)}
+        stored = {}
+        skipped = 0
+        for session_dir in sessions:
+            data = load_results(session_dir)
+            data.setdefault('images', {})
+            stored[session_dir] = data
+            for rel in find_overview_images(session_dir):
+                abs_path = os.path.join(session_dir, rel)
+                digest = file_hash(abs_path)
+                entry = data['images'].get(rel)
+                if not force and entry and entry.get('sha1') == digest and entry.get('model') == self.model_version:
+                    skipped += 1
+                    continue
+                pending.setdefault(session_dir, {})[abs_path] = (rel, digest)
+
+        total = sum(len(v) for v in pending.values())
+        print(f"[Reanalyze] {total} images to process, {skipped} already up to date.")
+        if total == 0:
+            return {'processed': 0, 'skipped': skipped, 'failed': 0}
+
+        # 2. Fan out chunks over the process pool; write each session as soon as it is complete
+        remaining = {s: len(v) for s, v in pending.items()}
+        owner = {p: s for s, v in pending.items() for p in v}
+        processed = failed = 0
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.model_path, self.backend, threads)) as pool:
+            futures = []
+            for session_dir in sorted(pending):
+                paths = sorted(pending[session_dir])
+                for i in range(0, len(paths), self.chunk_size):
+                    futures.append(pool.submit(_analyze_chunk, paths[i:i + self.chunk_size], self.batch_size))
+
+            for fut in as_completed(futures):
+                try:
+                    chunk = fut.result()
+                except BrokenProcessPool:
+                    raise RuntimeError(f"[Reanalyze] Workers could not load model {self.model_path} ({self.backend}); "
+                                       f"nothing was saved for the remaining images.") from None
+                for abs_path, dets in chunk.items():
+                    session_dir = owner[abs_path]
+                    rel, digest = pending[session_dir][abs_path]
+                    if dets is None:
+                        print(f"[Reanalyze] Could not read {abs_path}")
+                        failed += 1
+                    else:
+                        stored[session_dir]['images'][rel] = {
+                            'sha1': digest, 'model': self.model_version, 'detections': dets
+                        }
+                        processed += 1
+                    remaining[session_dir] -= 1
+                    if remaining[session_dir] == 0:
+                        save_results(session_dir, stored[session_dir])
+                        print(f"[Reanalyze] {os.path.basename(session_dir)}: {len(pending[session_dir])} images updated.")
+
+        print(f"[Reanalyze] Done. processed={processed}, skipped={skipped}, failed={failed}")
+        return {'processed': processed, 'skipped': skipped, 'failed': failed}
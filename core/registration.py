@@ -0,0 +1,236 @@
+import time
+import numpy as np
+import cv2
+
+
+def phase_correlate(ref, img, max_side=256, exclude=5):
+    """
+    FFT phase correlation between two views of the same area.
+    Both images are converted to gray and downsampled to at most max_side px
+    (same size), so a call costs a few ms regardless of the input resolution.
+
+    Returns (dx, dy, psr): shift of `img` relative to `ref` in `ref` pixels, and
+    the peak-to-sidelobe ratio of the correlation surface (peak height over the
+    rest of the surface, outside +-`exclude` px, in standard deviations). Unlike
+    the raw peak value, the PSR separates real matches from unrelated image
+    pairs on textured SEM frames.
+    """
+    ref = _gray(ref)
+    img = _gray(img)
+    h, w = ref.shape[:2]
+    scale = min(1.0, max_side / max(h, w))
+    size = (max(8, int(round(w * scale))), max(8, int(round(h * scale))))
+    ref_s = cv2.resize(ref, size, interpolation=cv2.INTER_AREA)
+    img_s = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+    window = cv2.createHanningWindow(size, cv2.CV_32F)
+    (dx, dy), _ = cv2.phaseCorrelate(ref_s, img_s, window)
+    sx = w / size[0]
+    sy = h / size[1]
+    return dx * sx, dy * sy, _psr(ref_s, img_s, window, exclude)
+
+
+def _psr(a, b, window, exclude):
+    # Zero-mean before windowing: otherwise the window itself correlates and puts a peak at zero shift
+    fa = np.fft.fft2((a - a.mean()) * window)
+    fb = np.fft.fft2((b - b.mean()) * window)
+    cross = np.conj(fa) * fb
+    surface = np.real(np.fft.ifft2(cross / np.maximum(np.abs(cross), 1e-9)))
+    py, px = np.unravel_index(np.argmax(surface), surface.shape)
+    # Centre the peak so the exclusion window does not wrap around
+    surface = np.roll(surface, (surface.shape[0] // 2 - py, surface.shape[1] // 2 - px), axis=(0, 1))
+    cy, cx = surface.shape[0] // 2, surface.shape[1] // 2
+    peak = surface[cy, cx]
+    mask = np.ones(surface.shape, dtype=bool)
+    mask[cy - exclude:cy + exclude + 1, cx - exclude:cx + exclude + 1] = False
+    side = surface[mask]
+    return float((peak - side.mean()) / (side.std() + 1e-12))
+
+
+def aligned_ncc(ref, img, dx, dy):
+    """
+    Pearson correlation of `ref` and `img` on their overlap after undoing the
+    shift (dx, dy) measured by phase_correlate. A real match is close to 1;
+    an unrelated frame stays low even when its correlation peak looked sharp.
+    """
+    h, w = ref.shape[:2]
+    m = np.float32([[1, 0, -dx], [0, 1, -dy]])
+    aligned = cv2.warpAffine(img, m, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=np.nan)
+    x0, x1 = int(np.ceil(max(0.0, -dx))), int(np.floor(min(w, w - dx)))
+    y0, y1 = int(np.ceil(max(0.0, -dy))), int(np.floor(min(h, h - dy)))
+    a = ref[y0:y1, x0:x1].ravel()
+    b = aligned[y0:y1, x0:x1].ravel()
+    valid = np.isfinite(b)
+    a, b = a[valid], b[valid]
+    if a.size < 16 or a.std() == 0 or b.std() == 0:
+        return 0.0
+    return float(np.corrcoef(a, b)[0, 1])
+
+
+def _gray(img):
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return img.astype(np.float32, copy=False)
+
+
+class DriftEstimator:
+    """
+    Running model of where the stage actually lands:
+
+        landing_error = drift + (scale - 1) * commanded_offset
+
+    `drift` covers stage repeatability / thermal drift, `scale` a wrong nominal
+    field of view (200000 / mag). Fitted by exponentially weighted least squares
+    over all registrations so far (old observations fade with `forgetting`).
+    Units: mm (stage).
+
+    A registration whose residual against the current prediction is far larger
+    than the recent residuals (gate_k x their median, at least gate_floor) is
+    rejected instead of fitted, so one bad match cannot bias every later target.
+    The first `warmup` observations are always accepted, and so is the next one
+    after `warmup` rejections in a row (a real step in the drift, not an outlier).
+    """
+
+    def __init__(self, forgetting=0.85, ridge=1e-9, gate_k=4.0, gate_floor=0.002, warmup=3, history=20):
+        self.forgetting = forgetting
+        self.ridge = ridge
+        self.gate_k = gate_k
+        self.gate_floor = gate_floor  # mm
+        self.warmup = warmup
+        self.history = history
+        self._residuals = []
+        self._rejected_in_row = 0
+        self.rejected = 0
+        self._ata = np.zeros((3, 3))
+        self._atb = np.zeros(3)
+        self.params = np.zeros(3)  # drift_x, drift_y, scale - 1
+        self.observations = 0
+
+    def residual(self, offset_x, offset_y, err_x, err_y):
+        px, py = self.predict(offset_x, offset_y)
+        return float(np.hypot(err_x - px, err_y - py))
+
+    def update(self, offset_x, offset_y, err_x, err_y):
+        """Fits one landing error (mm). Returns False when it was rejected as an outlier."""
+        r = self.residual(offset_x, offset_y, err_x, err_y)
+        if self.observations >= self.warmup:
+            limit = max(self.gate_floor, self.gate_k * float(np.median(self._residuals)))
+            if r > limit and self._rejected_in_row < self.warmup:
+                self.rejected += 1
+                self._rejected_in_row += 1
+                return False
+        self._rejected_in_row = 0
+        self._residuals = (self._residuals + [r])[-self.history:]
+
+        rows = np.array([[1.0, 0.0, offset_x], [0.0, 1.0, offset_y]])
+        b = np.array([err_x, err_y])
+        self._ata = self.forgetting * self._ata + rows.T @ rows
+        self._atb = self.forgetting * self._atb + rows.T @ b
+        # Tiny ridge: with too few observations the minimum-norm solution puts the error into drift, not scale
+        self.params = np.linalg.solve(self._ata + self.ridge * np.eye(3), self._atb)
+        self.observations += 1
+        return True
+
+    def predict(self, offset_x, offset_y):
+        """Expected landing error (mm) for a commanded offset from the overview centre."""
+        if self.observations == 0:
+            return 0.0, 0.0
+        dx, dy, k = self.params
+        return dx + k * offset_x, dy + k * offset_y
+
+    @property
+    def scale(self):
+        return 1.0 + float(self.params[2])
+
+    def summary(self):
+        return {'observations': self.observations, 'rejected': self.rejected, 'drift_x_um': float(self.params[0] * 1000),
+                'drift_y_um': float(self.params[1] * 1000), 'fov_scale': self.scale}
+
+
+class FrameRegistrar:
+    """
+    Compares a high-mag frame with the region of the overview it was supposed
+    to show, and reports where the stage really landed.
+
+    A measurement is only trusted when both images have structure to match
+    (contrast after a light low-pass, so pixel noise does not count), the
+    correlation peak stands out (peak-to-sidelobe ratio >= min_psr), the
+    shift is well inside the crop (<= max_shift_frac of its half-size; a
+    larger apparent shift means the frame mostly shows something else) and
+    the two images agree once aligned (correlation >= min_ncc).
+
+    Defaults were chosen on simulator pairs with known landing errors (800 to
+    10000 particles): <= 1% wrong shifts accepted, 2-6% of unrelated frames.
+    """
+
+    def __init__(self, min_psr=6.0, min_ncc=0.6, max_shift_frac=0.6, min_contrast=4.0, blur_px=1.0, correct_frac=0.1,
+                 max_side=256, min_crop_px=24):
+        self.min_psr = min_psr
+        self.min_ncc = min_ncc
+        self.max_shift_frac = max_shift_frac
+        self.min_contrast = min_contrast  # std of the low-passed gray image (8-bit levels)
+        self.blur_px = blur_px
+        self.correct_frac = correct_frac  # correct when off by more than this fraction of the high-mag FOV
+        self.max_side = max_side
+        self.min_crop_px = min_crop_px
+        self.drift = DriftEstimator()
+        self.stats = {'registered': 0, 'low_confidence': 0, 'out_of_range': 0, 'featureless': 0, 'skipped': 0,
+                      'corrected': 0, 'total_ms': 0.0}
+
+    def measure(self, overview, expected_px, overview_scale_um, frame, frame_scale_um):
+        """
+        expected_px: (x, y) in the overview where the high-mag frame should be centred.
+        Returns (err_x_um, err_y_um) = actual - expected landing position, or None
+        when the region is too small in the overview or the match is unreliable.
+        """
+        t0 = time.perf_counter()
+        oh, ow = overview.shape[:2]
+        fh, fw = frame.shape[:2]
+        crop_w = fw * frame_scale_um / overview_scale_um
+        crop_h = fh * frame_scale_um / overview_scale_um
+        if min(crop_w, crop_h) < self.min_crop_px or crop_w > ow or crop_h > oh:
+            self.stats['skipped'] += 1
+            return None
+
+        # Expected region, clamped inside the overview
+        cx, cy = expected_px
+        x0 = int(round(np.clip(cx - crop_w / 2, 0, ow - crop_w)))
+        y0 = int(round(np.clip(cy - crop_h / 2, 0, oh - crop_h)))
+        crop = _gray(overview[y0:y0 + int(round(crop_h)), x0:x0 + int(round(crop_w))])
+        frame_small = cv2.resize(_gray(frame), (crop.shape[1], crop.shape[0]), interpolation=cv2.INTER_AREA)
+        if self.blur_px > 0:
+            crop = cv2.GaussianBlur(crop, (0, 0), self.blur_px)
+            frame_small = cv2.GaussianBlur(frame_small, (0, 0), self.blur_px)
+
+        try:
+            if min(crop.std(), frame_small.std()) < self.min_contrast:
+                self.stats['featureless'] += 1
+                return None
+            dx, dy, psr = phase_correlate(crop, frame_small, self.max_side)
+            if psr < self.min_psr:
+                self.stats['low_confidence'] += 1
+                return None
+            if max(abs(dx) / (crop.shape[1] / 2), abs(dy) / (crop.shape[0] / 2)) > self.max_shift_frac:
+                self.stats['out_of_range'] += 1
+                return None
+            if aligned_ncc(crop, frame_small, dx, dy) < self.min_ncc:
+                self.stats['low_confidence'] += 1
+                return None
+        finally:
+            self.stats['total_ms'] += (time.perf_counter() - t0) * 1000
+
+        self.stats['registered'] += 1
+        # Content moved by +d in the frame => the frame centre sits at -d; also undo the clamping offset
+        err_px_x = (x0 + crop.shape[1] / 2 - dx) - cx
+        err_px_y = (y0 + crop.shape[0] / 2 - dy) - cy
+        return err_px_x * overview_scale_um, err_px_y * overview_scale_um
+
+    def needs_correction(self, err_um, frame_fov_um):
+        return err_um is not None and np.hypot(*err_um) > self.correct_frac * frame_fov_um
+
+    def summary(self):
+        n = sum(self.stats[k] for k in ('registered', 'low_confidence', 'out_of_range', 'featureless'))
+        out = dict(self.stats)
+        out['mean_ms'] = self.stats['total_ms'] / n if n else 0.0
+        out.update(self.drift.summary())
+        return out
@@ -0,0 +1,348 @@
+import os
+import glob
+import json
+import time
+import numpy as np
+
+# Per-session operation timings (written next to the session log, read back by CostModel)
+OP_TIMINGS_FILE = "op_timings.json"
+
+
+def scan_profile(scan_settings):
+    """Key for scan-time lookups: resolution, dwell and accumulation decide how long a frame takes."""
+    sc = scan_settings or {}
+    return f"{sc.get('width', '?')}x{sc.get('height', '?')}/dwell={sc.get('dwell', '-')}/acc={sc.get('accumulation', 1)}"
+
+
+def format_duration(seconds):
+    seconds = int(round(max(0.0, seconds)))
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}h {m:02d}m" if h else f"{m}m {s:02d}s"
+
+
+class OperationLog:
+    """
+    Measured duration of every operation in a session, keyed the way CostModel
+    looks them up:
+
+        move_stage          key = travel distance (mm), None if the start was unknown
+        set_magnification   key = |log10(new / old)|, None if the old value was unknown
+        auto_focus          key = magnification
+        scan                key = scan_profile(...)
+        detect, save        key = None
+    """
+
+    def __init__(self, instrument=None):
+        self.instrument = instrument
+        self.ops = []
+
+    def record(self, op, seconds, key=None):
+        self.ops.append({'op': op, 'key': key, 'seconds': float(seconds)})
+
+    def total(self):
+        return sum(o['seconds'] for o in self.ops)
+
+    def save(self, session_dir):
+        path = os.path.join(session_dir, OP_TIMINGS_FILE)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({'instrument': self.instrument, 'ops': self.ops}, f, indent=1)
+        return path
+
+
+class CostModel:
+    """
+    Per-operation durations learned from past sessions (op_timings.json files):
+
+    - stage move:          t = base + per_mm * distance (least squares)
+    - magnification change: t = base + per_decade * |log10 ratio|; 0 when unchanged
+    - auto-focus:          median of the runs at the nearest magnification (log scale)
+    - scan:                median per scan profile
+    - detect / save:       median
+
+    Without history the DEFAULTS below are used (the old fixed waits).
+    """
+
+    DEFAULTS = {'move_stage': (1.0, 0.0), 'set_magnification': (0.5, 0.0), 'auto_focus': 1.0, 'scan': 2.0,
+                'detect': 0.2, 'save': 0.1}
+
+    def __init__(self):
+        self.move = self.DEFAULTS['move_stage']
+        self.mag = self.DEFAULTS['set_magnification']
+        self.af = {}       # magnification -> median seconds
+        self.scans = {}    # profile -> median seconds
+        self.overhead = {'detect': self.DEFAULTS['detect'], 'save': self.DEFAULTS['save']}
+        self.samples = 0
+        self.sessions = 0
+
+    @classmethod
+    def from_history(cls, base_dir="results", instrument=None, max_sessions=10):
+        """Fits the model on the newest `max_sessions` sessions recorded on the same instrument."""
+        model = cls()
+        ops = []
+        for path in sorted(glob.glob(os.path.join(base_dir, "Session_*", OP_TIMINGS_FILE)), reverse=True):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if instrument is not None and data.get('instrument') != instrument:
+                continue
+            ops.extend(data.get('ops', []))
+            model.sessions += 1
+            if model.sessions >= max_sessions:
+                break
+        model.fit(ops)
+        return model
+
+    def fit(self, ops):
+        by_op = {}
+        for o in ops:
+            by_op.setdefault(o['op'], []).append(o)
+        self.samples = len(ops)
+
+        self.move = self._fit_line([(o['key'], o['seconds']) for o in by_op.get('move_stage', []) if o['key'] is not None],
+                                   self.move)
+        # Elided (unchanged) magnifications are never sent, so every sample is a real change
+        self.mag = self._fit_line([(o['key'], o['seconds']) for o in by_op.get('set_magnification', [])
+                                   if o['key'] is not None], self.mag)
+        self.af = self._medians(by_op.get('auto_focus', []))
+        self.scans = self._medians(by_op.get('scan', []))
+        for op in ('detect', 'save'):
+            if by_op.get(op):
+                self.overhead[op] = float(np.median([o['seconds'] for o in by_op[op]]))
+
+    @staticmethod
+    def _fit_line(points, default):
+        if not points:
+            return default
+        x = np.array([p[0] for p in points], dtype=np.float64)
+        t = np.array([p[1] for p in points], dtype=np.float64)
+        if len(x) >= 3 and np.ptp(x) > 0:
+            slope, base = np.polyfit(x, t, 1)
+        else:
+            slope, base = 0.0, float(np.median(t))
+        return max(0.0, float(base)), max(0.0, float(slope))
+
+    @staticmethod
+    def _medians(ops):
+        groups = {}
+        for o in ops:
+            groups.setdefault(o['key'], []).append(o['seconds'])
+        return {k: float(np.median(v)) for k, v in groups.items()}
+
+    def move_time(self, distance_mm):
+        base, per_mm = self.move
+        return base + per_mm * distance_mm
+
+    def mag_time(self, old, new):
+        if old is not None and old == new:
+            return 0.0
+        base, per_decade = self.mag
+        return base + per_decade * (abs(np.log10(new / old)) if old else 1.0)
+
+    def af_time(self, mag):
+        mags = [m for m in self.af if m]
+        if not mags:
+            return self.DEFAULTS['auto_focus']
+        nearest = min(mags, key=lambda m: abs(np.log(m / mag)))
+        return self.af[nearest]
+
+    def scan_time(self, profile):
+        if profile in self.scans:
+            return self.scans[profile]
+        # Unknown profile: any measured scan is a better guess than the default
+        return float(np.median(list(self.scans.values()))) if self.scans else self.DEFAULTS['scan']
+
+    def describe(self):
+        return (f"{self.samples} samples from {self.sessions} session(s): move {self.move[0]:.2f}s + {self.move[1]:.3f}s/mm, "
+                f"mag {self.mag[0]:.2f}s, AF {self.af_time(5000):.2f}s, scan {self.scan_time(None):.2f}s")
+
+
+class RunPlanner:
+    """
+    Predicts how long a run takes and, given a time budget, chooses per slot how
+    many particles to shoot (high_count) and whether to keep the High Mag 2 pass.
+
+    Particle positions are unknown before the overview, so target moves use the
+    expected distances of random points in the overview field (centre -> first
+    target ~0.38 FOV, target -> target ~0.52 FOV).
+    """
+
+    # Relative value of a High Mag 2 image compared to a High Mag 1 image
+    MAG2_WEIGHT = 0.5
+
+    def __init__(self, cost_model, scan_key=None, slot_coordinates=None, start_pos=None):
+        self.cost = cost_model
+        self.scan_key = scan_key
+        self.slot_coordinates = slot_coordinates or {}
+        self.start_pos = start_pos  # stage position before the first slot, if known
+
+    def _frame_time(self):
+        return self.cost.scan_time(self.scan_key) + self.cost.overhead['save']
+
+    def slot_costs(self, settings, prev_pos=None, prev_mag=None, pos=None):
+        """
+        Returns (overview_s, per_target_s, per_mag2_s) for one slot: the fixed
+        overview part, the cost of each High Mag 1 target and the extra cost of
+        its High Mag 2 pass.
+        """
+        low = settings['low_mag']
+        mag1 = settings['high_mag']
+        mag2 = settings.get('high_mag_2', 0)
+        fov_mm = 200.0 / low
+
+        if prev_pos is not None and pos is not None:
+            travel = float(np.hypot(pos[0] - prev_pos[0], pos[1] - prev_pos[1]))
+            overview = self.cost.move_time(travel)
+        else:
+            overview = self.cost.move_time(10.0)  # unknown start: assume a typical slot-to-slot move
+        overview += (self.cost.mag_time(prev_mag, low) + self.cost.af_time(low) + self._frame_time()
+                     + self.cost.overhead['detect'])
+        # First target comes from the overview centre at low mag
+        overview += (self.cost.move_time(0.38 * fov_mm) - self.cost.move_time(0.52 * fov_mm)
+                     + self.cost.mag_time(low, mag1))
+
+        target = self.cost.move_time(0.52 * fov_mm) + self.cost.af_time(mag1) + self._frame_time()
+        mag2_cost = 0.0
+        if mag2 > mag1:
+            # Zoom in, focus, shoot, and zoom back out for the next target
+            mag2_cost = (self.cost.mag_time(mag1, mag2) + self.cost.af_time(mag2) + self._frame_time()
+                         + self.cost.mag_time(mag2, mag1))
+        return overview, target, mag2_cost
+
+    def _costs(self, active_slots):
+        costs = {}
+        prev_pos, prev_mag = self.start_pos, None
+        for sid, data in active_slots.items():
+            pos = self.slot_coordinates.get(sid)
+            if pos is None:
+                continue
+            costs[sid] = self.slot_costs(data['settings'], prev_pos, prev_mag, pos)
+            prev_pos = pos
+            s = data['settings']
+            prev_mag = s['high_mag_2'] if s.get('high_mag_2', 0) > s['high_mag'] else s['high_mag']
+        return costs
+
+    def estimate(self, active_slots):
+        """Returns (total_seconds, {sid: seconds}) for the slots as configured."""
+        per_slot = {}
+        for sid, (overview, target, mag2) in self._costs(active_slots).items():
+            n = active_slots[sid]['settings']['high_count']
+            per_slot[sid] = overview + n * (target + mag2)
+        return sum(per_slot.values()), per_slot
+
+    def plan(self, active_slots, budget_s):
+        """
+        Returns a copy of active_slots whose high_count / high_mag_2 fit in budget_s.
+
+        Greedy on value per second: every slot starts with one target and no
+        High Mag 2; then the step with the best marginal value per second is
+        taken (next target of a slot, or its High Mag 2 pass) while it fits.
+        Value per slot is harmonic in the number of images, so coverage spreads
+        across samples instead of exhausting the first one. A slot never gets
+        more than settings.get('max_high_count', high_count) targets, and High
+        Mag 2 is only kept where it was requested. If even the overviews do not
+        fit, the trailing slots are dropped.
+        """
+        costs = self._costs(active_slots)
+        plan = {}
+        used = 0.0
+        for sid, (overview, target, _) in costs.items():
+            if used + overview + target > budget_s:
+                print(f"[Planner] Budget exhausted: slot #{sid} ({active_slots[sid]['name']}) and later slots dropped.")
+                break
+            s = active_slots[sid]['settings']
+            plan[sid] = {'n': 1, 'mag2': False, 'cap': max(1, s.get('max_high_count', s['high_count']))}
+            used += overview + target
+
+        while True:
+            best = None
+            for sid, p in plan.items():
+                _, target, mag2 = costs[sid]
+                steps = []
+                if p['n'] < p['cap']:
+                    value = (1.0 + (self.MAG2_WEIGHT if p['mag2'] else 0.0)) / (p['n'] + 1)
+                    steps.append(('count', value, target + (mag2 if p['mag2'] else 0.0)))
+                if not p['mag2'] and mag2 > 0:
+                    value = self.MAG2_WEIGHT * sum(1.0 / k for k in range(1, p['n'] + 1))
+                    steps.append(('mag2', value, p['n'] * mag2))
+                for kind, value, cost in steps:
+                    if used + cost <= budget_s and (best is None or value / max(cost, 1e-6) > best[0]):
+                        best = (value / max(cost, 1e-6), sid, kind, cost)
+            if best is None:
+                break
+            _, sid, kind, cost = best
+            if kind == 'count':
+                plan[sid]['n'] += 1
+            else:
+                plan[sid]['mag2'] = True
+            used += cost
+
+        planned = {}
+        for sid, p in plan.items():
+            data = dict(active_slots[sid])
+            settings = dict(data['settings'])
+            settings['high_count'] = p['n']
+            if not p['mag2']:
+                settings['high_mag_2'] = 0
+            data['settings'] = settings
+            planned[sid] = data
+        return planned
+
+
+class ProgressTracker:
+    """
+    Live ETA: remaining planned work, scaled by how fast the run has actually
+    gone compared with the plan so far.
+    """
+
+    def __init__(self, planner, active_slots):
+        self.slots = {}
+        for sid, (overview, target, mag2) in planner._costs(active_slots).items():
+            s = active_slots[sid]['settings']
+            self.slots[sid] = {'overview': overview, 'target': target + (mag2 if s.get('high_mag_2', 0) > s['high_mag'] else 0.0),
+                               'remaining': s['high_count'], 'overview_done': False}
+        self.predicted_total = self.remaining_predicted()
+        self.t0 = time.perf_counter()
+        self.predicted_done = 0.0
+
+    def remaining_predicted(self):
+        return sum((0.0 if s['overview_done'] else s['overview']) + s['remaining'] * s['target']
+                   for s in self.slots.values())
+
+    def overview_done(self, sid, targets_found):
+        s = self.slots.get(sid)
+        if s is None:
+            return
+        s['overview_done'] = True
+        self.predicted_done += s['overview']
+        # Fewer particles than requested: the rest of this slot will not happen
+        s['remaining'] = min(s['remaining'], targets_found)
+
+    def target_done(self, sid):
+        s = self.slots.get(sid)
+        if s is None or s['remaining'] <= 0:
+            return
+        s['remaining'] -= 1
+        self.predicted_done += s['target']
+
+    def slot_done(self, sid):
+        s = self.slots.get(sid)
+        if s is not None:
+            s['remaining'] = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.t0
+
+    def eta(self):
+        """Seconds left. The plan/actual ratio is only trusted once some work is done."""
+        remaining = self.remaining_predicted()
+        if self.predicted_done <= 0:
+            return remaining
+        ratio = float(np.clip(self.elapsed / self.predicted_done, 0.25, 4.0))
+        return remaining * ratio
+
+    def describe(self):
+        return f"elapsed {format_duration(self.elapsed)}, ETA {format_duration(self.eta())}"
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import numpy as np
+import cv2
+
+
+class SettleModel:
+    """
+    Expected settle time vs. move distance: t = base + per_mm * distance (seconds).
+    Fitted per instrument by StageSettler.calibrate and stored as JSON.
+    """
+
+    def __init__(self, base=0.0, per_mm=0.0, samples=None):
+        self.base = base
+        self.per_mm = per_mm
+        self.samples = samples or []
+
+    def predict(self, distance):
+        return max(0.0, self.base + self.per_mm * distance)
+
+    @classmethod
+    def fit(cls, distances, times):
+        d = np.asarray(distances, dtype=np.float64)
+        t = np.asarray(times, dtype=np.float64)
+        if len(d) >= 2 and np.ptp(d) > 0:
+            per_mm, base = np.polyfit(d, t, 1)
+        else:
+            per_mm, base = 0.0, float(t.mean()) if len(t) else 0.0
+        return cls(max(0.0, float(base)), max(0.0, float(per_mm)), [[float(a), float(b)] for a, b in zip(d, t)])
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({'base': self.base, 'per_mm': self.per_mm, 'samples': self.samples}, f, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data['base'], data['per_mm'], data.get('samples'))
+
+
+class StageSettler:
+    """
+    Closed-loop settling: instead of a fixed sleep, poll a reading (stage position,
+    working distance, ...) until it is stable within tolerance for `stable_reads`
+    consecutive polls, or `timeout` is hit.
+
+    Being stable within `tol` is the settle criterion. A stage does not read back
+    exactly the commanded point, so the reading only has to be within the much
+    looser `target_tol` of `target` - tightened to half the move distance (not
+    below `tol`) for short hops, so the start position (before a non-blocking
+    move begins) is never mistaken for a settled stage.
+
+    With a calibrated SettleModel, the first poll is delayed by part of the
+    predicted settle time (no point polling a stage that is still travelling) and
+    the timeout scales with the move distance.
+    """
+
+    def __init__(self, tol=0.0005, stable_reads=3, poll_interval=0.05, timeout=10.0,
+                 model=None, early_fraction=0.5, image_shift_px=0.5, target_tol=0.01):
+        self.tol = tol
+        self.target_tol = target_tol
+        self.stable_reads = stable_reads
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.model = model
+        self.early_fraction = early_fraction
+        self.image_shift_px = image_shift_px
+        self.last_elapsed = 0.0
+        self.last_timed_out = False
+        self.timeouts = 0
+
+    def load_model(self, path):
+        if os.path.exists(path):
+            self.model = SettleModel.load(path)
+            print(f"[Settle] Loaded calibration {path} (base={self.model.base:.3f}s, {self.model.per_mm:.4f}s/mm)")
+
+    def wait(self, read, target=None, distance=0.0, read_frame=None):
+        """
+        Blocks until `read()` is stable within tol (and within target_tol of
+        `target`, if given; at most distance / 2 when the move distance is known).
+        read_frame: optional callable returning a quick low-res frame; when given,
+        settling also requires the frame-to-frame shift to be below image_shift_px.
+        Returns the elapsed time in seconds.
+        """
+        t0 = time.perf_counter()
+        timeout = self.timeout
+        if self.model is not None:
+            predicted = self.model.predict(distance)
+            time.sleep(predicted * self.early_fraction)
+            timeout = max(self.timeout, predicted * 3)
+
+        on_target_tol = self.target_tol
+        if on_target_tol is not None and distance > 0:
+            on_target_tol = min(on_target_tol, max(distance / 2, self.tol))
+
+        last = None
+        stable = 0
+        prev_frame = None
+        self.last_timed_out = False
+        while True:
+            value = np.atleast_1d(np.asarray(read(), dtype=np.float64))
+            ok = last is not None and np.all(np.abs(value - last) <= self.tol)
+            if ok and target is not None and self.target_tol is not None:
+                ok = np.all(np.abs(value - np.atleast_1d(target)) <= on_target_tol)
+            stable = stable + 1 if ok else 0
+            last = value
+
+            if stable >= self.stable_reads:
+                if read_frame is None:
+                    break
+                frame = self._gray(read_frame())
+                if prev_frame is not None and self._shift(prev_frame, frame) <= self.image_shift_px:
+                    break
+                prev_frame = frame
+
+            if time.perf_counter() - t0 > timeout:
+                self.timeouts += 1
+                self.last_timed_out = True
+                print(f"[Settle] Not stable after {timeout:.1f}s (last reading {value.tolist()}); continuing.")
+                break
+            time.sleep(self.poll_interval)
+
+        self.last_elapsed = time.perf_counter() - t0
+        return self.last_elapsed
+
+    @staticmethod
+    def _gray(frame):
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return frame.astype(np.float32)
+
+    @staticmethod
+    def _shift(a, b):
+        (dx, dy), _ = cv2.phaseCorrelate(a, b)
+        return float(np.hypot(dx, dy))
+
+    def calibrate(self, adapter, origin, distances=(0.002, 0.02, 0.2, 1.0, 5.0, 10.0), repeats=2, save_path=None):
+        """
+        Measures settle time against move distance on the connected instrument and
+        fits a SettleModel. Moves along +X from `origin` and back, so make sure
+        origin + max(distances) is inside the safe stage travel.
+        """
+        ox, oy = origin
+        saved_model, self.model = self.model, None  # measure without the early-sleep shortcut
+        distances_done, times = [], []
+        try:
+            adapter.command_move(ox, oy)
+            self.wait(adapter.get_stage_position, target=(ox, oy))
+            for d in distances:
+                for _ in range(repeats):
+                    for tx in (ox + d, ox):
+                        t0 = time.perf_counter()
+                        adapter.command_move(tx, oy)
+                        self.wait(adapter.get_stage_position, target=(tx, oy), distance=d)
+                        if self.last_timed_out:
+                            continue  # the timeout says nothing about the settle time
+                        # Stability needs `stable_reads` polls after the stage stops; that part is not settle time
+                        elapsed = time.perf_counter() - t0 - self.stable_reads * self.poll_interval
+                        distances_done.append(d)
+                        times.append(max(0.0, elapsed))
+                measured = [t for dd, t in zip(distances_done, times) if dd == d]
+                print(f"[Settle] {d:.3f} mm: " + (f"{np.mean(measured):.3f}s" if measured else "no stable reading"))
+        except Exception:
+            self.model = saved_model
+            raise
+
+        self.model = SettleModel.fit(distances_done, times)
+        print(f"[Settle] Calibrated: t = {self.model.base:.3f}s + {self.model.per_mm:.4f}s/mm * distance")
+        if save_path:
+            self.model.save(save_path)
+            print(f"[Settle] Saved calibration to {save_path}")
+        return self.model
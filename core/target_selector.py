@@ -0,0 +1,162 @@
+import math
+import numpy as np
+
+
+class TargetSelector:
+    """
+    Chooses which detections are worth a high-mag cycle.
+
+    Pipeline: confidence threshold -> edge exclusion -> minimum physical size
+    -> NMS (duplicate / overlapping boxes) -> ranking.
+
+    rank_by:
+        'conf'       : highest confidence first
+        'size'       : largest particle first
+        'isolation'  : farthest from neighbouring particles first (clean shots)
+        'stratified' : spread picks over a grid of the frame (spatial sampling)
+
+    Every option can be overridden per slot through the GUI settings dict
+    (keys: min_conf, nms_iou, edge_margin_px, min_size_um, rank_by).
+    """
+
+    RANK_MODES = ("conf", "size", "isolation", "stratified")
+
+    def __init__(self, min_conf=0.25, nms_iou=0.5, edge_margin_px=8, min_size_um=0.0, rank_by="conf"):
+        self.min_conf = min_conf
+        self.nms_iou = nms_iou
+        self.edge_margin_px = edge_margin_px
+        self.min_size_um = min_size_um
+        self.rank_by = rank_by
+        self.last_report = {}
+        self.last_candidates = []
+
+    def select(self, detections, img_w, img_h, pixel_scale_um, count, settings=None):
+        """
+        Returns at most `count` detections (same dict format as YOLODetector),
+        ordered by imaging priority. A summary of what was rejected is kept in
+        self.last_report for logging, and every detection that passed the
+        filters (before the count cut) in self.last_candidates.
+        """
+        opts = self._options(settings)
+        report = {'input': len(detections), 'low_conf': 0, 'edge': 0, 'too_small': 0, 'duplicate': 0,
+                  'selected': 0, 'rank_by': opts['rank_by']}
+        self.last_report = report
+        self.last_candidates = []
+
+        if not detections:
+            return []
+
+        # 1. Confidence
+        kept = [d for d in detections if d['conf'] >= opts['min_conf']]
+        report['low_conf'] = len(detections) - len(kept)
+
+        # 2. Edge exclusion (particle cut off by the frame border)
+        margin = opts['edge_margin_px']
+        before = len(kept)
+        kept = [d for d in kept
+                if d['x'] - d['w'] / 2 >= margin and d['x'] + d['w'] / 2 <= img_w - margin
+                and d['y'] - d['h'] / 2 >= margin and d['y'] + d['h'] / 2 <= img_h - margin]
+        report['edge'] = before - len(kept)
+
+        # 3. Minimum physical size (short side, in um)
+        if opts['min_size_um'] > 0:
+            before = len(kept)
+            kept = [d for d in kept if min(d['w'], d['h']) * pixel_scale_um >= opts['min_size_um']]
+            report['too_small'] = before - len(kept)
+
+        # 4. NMS - overlapping boxes are the same particle (or a cluster imaged once)
+        before = len(kept)
+        kept = self._nms(kept, opts['nms_iou'])
+        report['duplicate'] = before - len(kept)
+        self.last_candidates = kept
+
+        # 5. Ranking
+        ranked = self._rank(kept, img_w, img_h, count, opts['rank_by'])
+        selected = ranked[:max(count, 0)]
+        report['selected'] = len(selected)
+        return selected
+
+    def _options(self, settings):
+        settings = settings or {}
+        opts = {
+            'min_conf': float(settings.get('min_conf', self.min_conf)),
+            'nms_iou': float(settings.get('nms_iou', self.nms_iou)),
+            'edge_margin_px': float(settings.get('edge_margin_px', self.edge_margin_px)),
+            'min_size_um': float(settings.get('min_size_um', self.min_size_um)),
+            'rank_by': settings.get('rank_by', self.rank_by),
+        }
+        if opts['rank_by'] not in self.RANK_MODES:
+            print(f"[Selector] Unknown rank_by '{opts['rank_by']}', using 'conf'.")
+            opts['rank_by'] = "conf"
+        return opts
+
+    @staticmethod
+    def _boxes(dets):
+        arr = np.array([[d['x'], d['y'], d['w'], d['h']] for d in dets], dtype=np.float64).reshape(-1, 4)
+        x1 = arr[:, 0] - arr[:, 2] / 2
+        y1 = arr[:, 1] - arr[:, 3] / 2
+        x2 = arr[:, 0] + arr[:, 2] / 2
+        y2 = arr[:, 1] + arr[:, 3] / 2
+        return x1, y1, x2, y2
+
+    def _nms(self, dets, iou_thresh):
+        if len(dets) < 2:
+            return list(dets)
+
+        x1, y1, x2, y2 = self._boxes(dets)
+        areas = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+        order = np.argsort([-d['conf'] for d in dets], kind="stable")
+
+        keep = []
+        while order.size > 0:
+            i = order[0]
+            keep.append(i)
+            rest = order[1:]
+            iw = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+            ih = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+            inter = iw * ih
+            union = areas[i] + areas[rest] - inter
+            iou = np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+            order = rest[iou <= iou_thresh]
+
+        return [dets[i] for i in keep]
+
+    def _rank(self, dets, img_w, img_h, count, mode):
+        if mode == "size":
+            return sorted(dets, key=lambda d: d['w'] * d['h'], reverse=True)
+
+        if mode == "isolation":
+            if len(dets) < 2:
+                return list(dets)
+            pts = np.array([[d['x'], d['y']] for d in dets], dtype=np.float64)
+            dist = np.sqrt(((pts[:, None, :] - pts[None, :, :]) ** 2).sum(axis=2))
+            np.fill_diagonal(dist, np.inf)
+            # Gap between box edges rather than centres, so big particles are not favoured
+            radius = np.array([max(d['w'], d['h']) / 2 for d in dets])
+            gap = (dist - radius[:, None] - radius[None, :]).min(axis=1)
+            order = np.argsort(-gap, kind="stable")
+            return [dets[i] for i in order]
+
+        if mode == "stratified":
+            return self._stratified(dets, img_w, img_h, count)
+
+        return sorted(dets, key=lambda d: d['conf'], reverse=True)
+
+    @staticmethod
+    def _stratified(dets, img_w, img_h, count):
+        """Round-robin over a k x k grid so picks are spread over the frame."""
+        k = max(1, int(math.ceil(math.sqrt(count))))
+        cells = {}
+        for d in sorted(dets, key=lambda d: d['conf'], reverse=True):
+            cx = min(k - 1, int(d['x'] / img_w * k))
+            cy = min(k - 1, int(d['y'] / img_h * k))
+            cells.setdefault((cy, cx), []).append(d)
+
+        # Visit cells in a fixed raster order so the result is deterministic
+        queues = [cells[key] for key in sorted(cells)]
+        ranked = []
+        while any(queues):
+            for q in queues:
+                if q:
+                    ranked.append(q.pop(0))
+        return ranked
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+def spiral_offsets(rings):
+    """
+    Tile offsets (i, j) in units of one tile step, ring by ring outward from the
+    centre: (0, 0), then the 8 tiles of ring 1, the 16 of ring 2, ...
+    Within a ring the tiles go round by angle, so consecutive tiles are neighbours.
+    """
+    yield 0, 0
+    for r in range(1, rings + 1):
+        ring = [(i, j) for i in range(-r, r + 1) for j in range(-r, r + 1) if max(abs(i), abs(j)) == r]
+        ring.sort(key=lambda t: np.arctan2(t[1], t[0]))
+        for t in ring:
+            yield t
+
+
+class StageDetections:
+    """
+    Particles found so far in one slot, in stage coordinates (mm), so that
+    overlapping overview tiles do not count or image the same particle twice.
+    """
+
+    def __init__(self):
+        self.xs = np.empty(0)
+        self.ys = np.empty(0)
+        self.rs = np.empty(0)
+
+    def __len__(self):
+        return len(self.xs)
+
+    @staticmethod
+    def to_stage(detections, center, img_w, img_h, pixel_scale_um):
+        """(x, y, radius) arrays in mm for detections of a tile centred at `center` (mm)."""
+        if not detections:
+            return np.empty(0), np.empty(0), np.empty(0)
+        mm = pixel_scale_um / 1000.0
+        x = center[0] + (np.array([d['x'] for d in detections]) - img_w / 2) * mm
+        y = center[1] + (np.array([d['y'] for d in detections]) - img_h / 2) * mm
+        r = np.array([max(d['w'], d['h']) for d in detections]) / 2 * mm
+        return x, y, r
+
+    def new_only(self, detections, center, img_w, img_h, pixel_scale_um):
+        """Drops detections whose centre lies inside an already recorded particle (or vice versa)."""
+        if not len(self) or not detections:
+            return list(detections)
+        x, y, r = self.to_stage(detections, center, img_w, img_h, pixel_scale_um)
+        dist = np.hypot(x[:, None] - self.xs[None, :], y[:, None] - self.ys[None, :])
+        dup = (dist < np.maximum(r[:, None], self.rs[None, :])).any(axis=1)
+        return [d for d, is_dup in zip(detections, dup) if not is_dup]
+
+    def add(self, detections, center, img_w, img_h, pixel_scale_um):
+        x, y, r = self.to_stage(detections, center, img_w, img_h, pixel_scale_um)
+        self.xs = np.concatenate([self.xs, x])
+        self.ys = np.concatenate([self.ys, y])
+        self.rs = np.concatenate([self.rs, r])
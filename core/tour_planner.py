@@ -0,0 +1,62 @@
+import numpy as np
+
+
+def tour_length(points, order, start=None):
+    pts = np.asarray(points, dtype=np.float64)[list(order)]
+    if start is not None:
+        pts = np.vstack([np.asarray(start, dtype=np.float64)[None, :], pts])
+    return float(np.hypot(*np.diff(pts, axis=0).T).sum()) if len(pts) > 1 else 0.0
+
+
+def plan_tour(points, start=None, max_passes=50):
+    """
+    Visiting order for stage positions (open path, from `start` if given):
+    nearest-neighbour construction followed by 2-opt segment reversals until no
+    reversal shortens the path. Returns a list of indices into `points`.
+    """
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(pts)
+    if n <= 1:
+        return list(range(n))
+
+    # 1. Nearest neighbour
+    cur = np.asarray(start, dtype=np.float64) if start is not None else pts[0]
+    left = np.ones(n, dtype=bool)
+    order = []
+    for _ in range(n):
+        d = np.hypot(pts[:, 0] - cur[0], pts[:, 1] - cur[1])
+        d[~left] = np.inf
+        i = int(np.argmin(d))
+        order.append(i)
+        left[i] = False
+        cur = pts[i]
+
+    # 2. 2-opt; with a fixed start the start point is node 0 and never moves
+    if start is not None:
+        path = np.vstack([np.asarray(start, dtype=np.float64)[None, :], pts[order]])
+        idx = [-1] + order
+        first = 1
+    else:
+        path = pts[order]
+        idx = list(order)
+        first = 0
+    m = len(path)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(max(first, 1), m - 1):
+            # Reverse path[i..k] for every k > i at once
+            k = np.arange(i + 1, m)
+            a, b = path[i - 1], path[i]
+            c = path[k]
+            removed = np.hypot(*(b - a)) + np.where(k + 1 < m, np.hypot(*(path[np.minimum(k + 1, m - 1)] - c).T), 0.0)
+            added = np.hypot(*(c - a).T) + np.where(k + 1 < m, np.hypot(*(path[np.minimum(k + 1, m - 1)] - b).T), 0.0)
+            gain = removed - added
+            j = int(np.argmax(gain))
+            if gain[j] > 1e-12:
+                kk = k[j]
+                path[i:kk + 1] = path[i:kk + 1][::-1].copy()
+                idx[i:kk + 1] = idx[i:kk + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return idx[first:] if start is not None else idx
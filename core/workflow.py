@@ -1,7 +1,18 @@
 from .microscope import MicroscopeController
 from .ai_engine import YOLODetector
+from .target_selector import TargetSelector
+from .particle_stats import ParticleStatsCollector
+from .registration import FrameRegistrar
+from .tile_search import spiral_offsets, StageDetections
+from .tour_planner import plan_tour, tour_length
+from .run_planner import CostModel, RunPlanner, ProgressTracker, scan_profile, format_duration
 from utils.file_manager import FileManager
+from utils.capture_writer import CaptureWriter
 from utils.report_generator import ReportGenerator
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import threading
+import copy
 import time
 import os
 
@@ -19,15 +30,41 @@ SLOT_COORDINATES = {
 # ==========================================================
 
 class AutomationManager:
-    def __init__(self, simulation=True, model_path="yolov8n.pt", log_callback=None):
+    def __init__(self, simulation=True, model_path="yolov8n.pt", log_callback=None, backend="torch", sim_options=None,
+                 capture_options=None, inference_process=False, search_rings=0,
+                 two_phase=False, analysis_workers=2):
         self.simulation = simulation
         self.log_callback = log_callback
         
         self.log(f"[System] Initializing Automation Manager (Simulation={simulation})...")
         
-        self.sem = MicroscopeController(simulation=simulation)
-        self.ai = YOLODetector(model_path=model_path)
-        self.file_manager = FileManager()
+        if simulation:
+            # 시뮬레이션 샘플을 슬롯 좌표에 배치 (스테이지 mm -> 시뮬레이션 월드 um)
+            sim_options = dict(sim_options or {})
+            sim_options.setdefault('sample_centres', list(SLOT_COORDINATES.values()))
+        self.sem = MicroscopeController(simulation=simulation, sim_options=sim_options)
+        if inference_process:
+            # 별도 프로세스에서 추론 (GUI/워크플로 스레드와 GIL 경합 방지), 인터페이스는 동일
+            from .inference_server import RemoteDetector
+            self.ai = RemoteDetector(model_path=model_path, backend=backend)
+        else:
+            self.ai = YOLODetector(model_path=model_path, backend=backend)
+        self.selector = TargetSelector()
+        self.file_manager = FileManager(writer=CaptureWriter(**(capture_options or {})))
+        self.particle_stats = ParticleStatsCollector()
+        self.registrar = FrameRegistrar()
+        self.progress = None
+        # 적응형 탐색: 오버뷰에서 입자가 부족하면 주변 타일을 나선형으로 최대 search_rings 바퀴까지 추가 탐색
+        self.search_rings = search_rings
+        self.search_report = {}
+        # 2단계 모드: 전체 슬롯 오버뷰를 먼저 찍고 (분석은 워커 풀), 고배율은 전체 타겟을 한 경로로 촬영
+        self.two_phase = two_phase
+        self.analysis_workers = analysis_workers
+
+    def close(self):
+        """Releases background resources (inference server process)."""
+        if hasattr(self.ai, 'close'):
+            self.ai.close()
 
     def log(self, message):
         """Console output + GUI Callback"""
@@ -35,10 +72,11 @@ class AutomationManager:
         if self.log_callback:
             self.log_callback(message)
         
-    def run(self, active_slots=None):
+    def run(self, active_slots=None, budget_s=None):
         """
         active_slots: GUI에서 넘어온 슬롯 설정 데이터
         예: {1: {'name': 'NCM_01', 'settings': {...}}, 3: {...}}
+        budget_s: 장비 사용 가능 시간(초). 주어지면 슬롯별 high_count / High Mag 2 를 시간 안에 맞게 조정
         """
         self.log(">>> Starting Automation Workflow")
         
@@ -49,97 +87,411 @@ class AutomationManager:
             if not active_slots:
                 self.log("[Error] No active slots provided!")
                 return
+            
+            active_slots = self._plan_run(active_slots, budget_s)
 
-            for sid, data in active_slots.items():
-                sample_name = data['name']
-                settings = data['settings']
-                
-                # SLOT_COORDINATES에서 좌표 가져오기
-                if sid not in SLOT_COORDINATES:
-                    self.log(f"[Warning] No coordinates defined for Slot #{sid}. Skipping.")
-                    continue
-                    
-                start_x, start_y = SLOT_COORDINATES[sid]
-                
-                self.log(f"\n>>>> Processing Sample: {sample_name} (Slot #{sid}) at ({start_x}, {start_y})")
-                
-                # --- 1단계: 저배율 촬영 (Search) ---
-                # 5000배로 이동
-                self.sem.move_stage(start_x, start_y)
-                self.sem.set_magnification(settings['low_mag'])
-                self.sem.auto_focus()
-                
-                # 1장 찍고 저장
-                low_mag_img = self.sem.acquire_image()
-                self.file_manager.save_image(
-                    low_mag_img, 
-                    f"Overview_Center.jpg", 
-                    subdir=os.path.join(sample_name, f"LowMag_x{settings['low_mag']}")
-                )
-                
-                # --- 2단계: AI 탐지 ---
-                detections = self.ai.detect_particles(low_mag_img)
-                if not detections and self.simulation:
-                    detections = self.ai.detect_blobs_fallback(low_mag_img) # Fallback for simulation
-                
-                self.log(f"[{sample_name}] Found {len(detections)} particles. Selecting top {settings['high_count']}.")
-                
-                # 좌표 변환을 위한 스케일 계산 (예시: FOV 200um / 1024px)
-                # 주의: 실제 장비의 FOV 값에 맞춰야 정확한 이동이 가능합니다.
-                img_h, img_w = low_mag_img.shape[:2]
-                fov_width_um = 200000 / settings['low_mag'] # um 단위 (예: 40um)
-                pixel_scale_um = fov_width_um / img_w       # 픽셀당 um
-                
-                # --- 3단계: 고배율 촬영 루프 (High Mag 1 -> High Mag 2) ---
-                for j, target in enumerate(detections[:settings['high_count']]):
-                    
-                    # 3-1. 타겟 좌표 계산
-                    dx_px = target['x'] - (img_w / 2)
-                    dy_px = target['y'] - (img_h / 2)
-                    
-                    # [중요] 단위 변환: um -> mm (나누기 1000)
-                    # 스테이지는 mm 단위, 이미지 분석은 um 단위이므로 변환 필수
-                    dx_mm = (dx_px * pixel_scale_um) / 1000.0
-                    dy_mm = (dy_px * pixel_scale_um) / 1000.0
-                    
-                    # (주의: SEM 장비마다 축 방향이 다를 수 있음. +,- 부호 확인 필요)
-                    target_x = start_x + dx_mm
-                    target_y = start_y + dy_mm
-                    
-                    self.log(f"   --> Target #{j+1}: Moving to ({target_x:.4f}, {target_y:.4f}) [Shift: {dx_mm*1000:.1f} um, {dy_mm*1000:.1f} um]")
-                    self.sem.move_stage(target_x, target_y)
-                    
-                    # 3-2. High Mag 1 (예: x20,000)
-                    mag1 = settings['high_mag']
-                    self.log(f"       [High Mag 1] Shooting x{mag1}")
-                    self.sem.set_magnification(mag1)
-                    self.sem.auto_focus() # 고배율일수록 초점 다시 맞춰야 함
-                    img_high1 = self.sem.acquire_image()
-                    
-                    self.file_manager.save_image(
-                        img_high1, 
-                        f"Particle_{j+1:03d}_x{mag1}.jpg", 
-                        subdir=os.path.join(sample_name, f"HighMag_x{mag1}")
-                    )
-                    
-                    # 3-3. High Mag 2 (예: x50,000) - 더 확대!
-                    # settings에 'high_mag_2'가 있고, 0보다 클 때만 실행
-                    mag2 = settings.get('high_mag_2', 0)
-                    if mag2 > mag1:
-                        self.log(f"       [High Mag 2] Zooming in to x{mag2}")
-                        self.sem.set_magnification(mag2)
-                        self.sem.auto_focus() # 고배율일수록 초점 다시 맞춰야 함
-                        img_high2 = self.sem.acquire_image()
-                        
-                        self.file_manager.save_image(
-                            img_high2, 
-                            f"Particle_{j+1:03d}_x{mag2}.jpg", 
-                            subdir=os.path.join(sample_name, f"SuperHighMag_x{mag2}")
-                        )
+            if self.two_phase:
+                self._run_two_phase(active_slots)
+            else:
+                self._run_sequential(active_slots)
 
             self.log("\n>>> All Samples Completed.")
+            self._write_session_summary()
             
         except Exception as e:
             self.log(f"[CRITICAL ERROR] Automation stopped: {e}")
             import traceback
-            traceback.print_exc()
\ No newline at end of file
+            traceback.print_exc()
+        finally:
+            # 중단된 세션의 측정값도 다음 실행의 시간 예측에 사용
+            if self.sem.op_log.ops:
+                self.sem.op_log.save(self.file_manager.current_session_dir)
+
+    def _run_sequential(self, active_slots):
+        """Slot by slot: overview, selection and high-mag loop of one slot before moving to the next."""
+        for sid, data in active_slots.items():
+            sample_name = data['name']
+            settings = data['settings']
+            
+            # SLOT_COORDINATES에서 좌표 가져오기
+            if sid not in SLOT_COORDINATES:
+                self.log(f"[Warning] No coordinates defined for Slot #{sid}. Skipping.")
+                continue
+                
+            start_x, start_y = SLOT_COORDINATES[sid]
+            
+            self.log(f"\n>>>> Processing Sample: {sample_name} (Slot #{sid}) at ({start_x}, {start_y})")
+            
+            self._process_slot(sid, sample_name, settings, start_x, start_y)
+            self.progress.slot_done(sid)
+            self.log(f"[ETA] {sample_name} done - {self.progress.describe()}")
+
+    def _plan_run(self, active_slots, budget_s):
+        """Estimates the run time from past sessions and, with a budget, trims the slot settings to fit."""
+        cost = CostModel.from_history(self.file_manager.base_dir, self.sem.op_log.instrument)
+        planner = RunPlanner(cost, scan_profile(getattr(self.sem.adapter, 'scan_settings', {})), SLOT_COORDINATES,
+                             start_pos=self.sem.get_stage_position())
+        self.log(f"[Planner] Cost model: {cost.describe()}")
+        total, _ = planner.estimate(active_slots)
+        self.log(f"[Planner] Estimated run time: {format_duration(total)}")
+        
+        if budget_s:
+            if total > budget_s:
+                active_slots = planner.plan(active_slots, budget_s)
+                for sid, data in active_slots.items():
+                    s = data['settings']
+                    self.log(f"[Planner] {data['name']}: high_count={s['high_count']}, "
+                             f"High Mag 2 {'on' if s.get('high_mag_2', 0) > s['high_mag'] else 'off'}")
+                total, _ = planner.estimate(active_slots)
+            self.log(f"[Planner] Planned run time: {format_duration(total)} of {format_duration(budget_s)} budget")
+        self.progress = ProgressTracker(planner, active_slots)
+        return active_slots
+
+    def _process_slot(self, sid, sample_name, settings, start_x, start_y):
+        """
+        Overview -> detection -> selection -> high-mag loop for one sample slot.
+        With search_rings > 0 (adaptive search), further overview tiles are taken
+        in a spiral around the slot centre until high_count particles are imaged
+        or the ring limit is reached.
+        """
+        t_slot = time.perf_counter()
+        rings = settings.get('search_rings', self.search_rings)
+        # 타일 간격: 저배율 FOV (mm), 가장자리 제외로 놓치는 입자가 없도록 약간 겹침
+        step_mm = 200.0 / settings['low_mag'] * (1.0 - settings.get('search_overlap', 0.1))
+        found = StageDetections()
+        imaged = 0
+        tiles = 0
+        
+        for tile in spiral_offsets(rings):
+            if tiles and imaged >= settings['high_count']:
+                break
+            cx = start_x + tile[0] * step_mm
+            cy = start_y + tile[1] * step_mm
+            if tiles:
+                self.log(f"[{sample_name}] {imaged}/{settings['high_count']} imaged - searching tile {tile} at ({cx:.4f}, {cy:.4f})")
+            imaged += self._process_tile(sid, sample_name, settings, cx, cy, tile, found, imaged, rings)
+            tiles += 1
+        
+        elapsed = time.perf_counter() - t_slot
+        self.search_report[sample_name] = {'tiles': tiles, 'rings': rings, 'imaged': imaged,
+                                           'requested': settings['high_count'], 'candidates': len(found),
+                                           'seconds': round(elapsed, 2)}
+        if rings:
+            self.log(f"[Search] {sample_name}: {tiles} tile(s), {imaged}/{settings['high_count']} imaged, "
+                     f"{len(found)} particles found, {elapsed:.1f}s")
+
+    def _process_tile(self, sid, sample_name, settings, cx, cy, tile, found, first_index, rings):
+        """One overview tile: acquire, detect, drop particles already seen, select and image. Returns targets imaged."""
+        # 오버뷰 버퍼는 고배율 루프의 드리프트 정합에도 쓰이므로 타일이 끝날 때 반환
+        overview, low_meta = self._acquire_overview(settings, cx, cy)
+        try:
+            low_mag_img = overview.array
+            count = settings['high_count'] - first_index
+            res = self._analyze_overview(sid, sample_name, settings, low_mag_img, low_meta, (cx, cy), count,
+                                         self.selector, found, tile)
+            found.add(res['candidates'], (cx, cy), low_mag_img.shape[1], low_mag_img.shape[0], res['pixel_scale_um'])
+            self._log_analysis(sample_name, res, count)
+            targets = res['targets']
+            
+            if tile == (0, 0):
+                # 적응형 탐색이면 부족한 입자는 다음 타일에서 채움
+                self.progress.overview_done(sid, settings['high_count'] if rings else len(targets))
+            
+            # --- 3단계: 고배율 촬영 루프 (High Mag 1 -> High Mag 2) ---
+            for j, target in enumerate(targets):
+                self._image_target(sid, sample_name, settings, first_index + j, target, low_mag_img,
+                                   res['pixel_scale_um'], cx, cy)
+                self.progress.target_done(sid)
+                self.log(f"       [ETA] {self.progress.describe()}")
+            return len(targets)
+        finally:
+            overview.release()
+
+    def _acquire_overview(self, settings, cx, cy):
+        """Low-mag overview at (cx, cy). Returns (FrameBuffer, instrument metadata); the caller releases the frame."""
+        # --- 1단계: 저배율 촬영 (Search) ---
+        # 5000배로 이동
+        self.sem.move_stage(cx, cy)
+        self.sem.set_magnification(settings['low_mag'])
+        self.sem.auto_focus()
+        
+        # 1장 찍기 (저장은 탐지 후 - 탐지 결과를 메타데이터로 함께 저장)
+        overview = self.sem.acquire_frame()
+        return overview, self.sem.acquisition_metadata()
+
+    def _analyze_overview(self, sid, sample_name, settings, low_mag_img, low_meta, center, count, selector,
+                          found=None, tile=(0, 0), detect_lock=None):
+        """
+        Detection -> selection -> overview save for one overview frame. Touches no
+        instrument state and does not log, so it can run in a worker thread
+        (pass a private selector and a lock around the shared detector).
+        """
+        # --- 2단계: AI 탐지 ---
+        with detect_lock or contextlib.nullcontext():
+            t0 = time.perf_counter()
+            detections = self.ai.detect_particles(low_mag_img)
+            if not detections and self.simulation:
+                detections = self.ai.detect_blobs_fallback(low_mag_img) # Fallback for simulation
+            self.sem.op_log.record('detect', time.perf_counter() - t0)
+        
+        # 좌표 변환을 위한 스케일 계산 (예시: FOV 200um / 1024px)
+        # 주의: 실제 장비의 FOV 값에 맞춰야 정확한 이동이 가능합니다.
+        img_h, img_w = low_mag_img.shape[:2]
+        fov_width_um = 200000 / settings['low_mag'] # um 단위 (예: 40um)
+        pixel_scale_um = fov_width_um / img_w       # 픽셀당 um
+        
+        # 이전 타일과 겹치는 영역에서 이미 찾은 입자는 제외 (스테이지 좌표 기준)
+        fresh = found.new_only(detections, center, img_w, img_h, pixel_scale_um) if found is not None else detections
+        
+        # --- 2-1단계: 타겟 선별 (NMS, 가장자리 제외, 최소 크기, 랭킹) ---
+        targets = selector.select(fresh, img_w, img_h, pixel_scale_um, count, settings)
+        
+        filename = "Overview_Center.jpg" if tile == (0, 0) else f"Overview_Tile_{tile[0]:+d}_{tile[1]:+d}.jpg"
+        self._save_frame(
+            low_mag_img, 
+            filename, 
+            subdir=os.path.join(sample_name, f"LowMag_x{settings['low_mag']}"),
+            metadata=self._capture_metadata(sid, sample_name, "overview", low_meta, pixel_scale_um,
+                                            detections=detections, selected=targets, tile=list(tile))
+        )
+        return {'detections': detections, 'fresh': fresh, 'targets': targets, 'candidates': selector.last_candidates,
+                'report': selector.last_report, 'pixel_scale_um': pixel_scale_um, 'center': center}
+
+    def _log_analysis(self, sample_name, res, count):
+        """Logs the selection result and adds the candidates to the particle statistics."""
+        rep = res['report']
+        n_det, n_fresh = len(res['detections']), len(res['fresh'])
+        seen = f" ({n_det - n_fresh} already seen)" if n_fresh < n_det else ""
+        self.log(f"[{sample_name}] Found {n_det} particles{seen}. Selected {len(res['targets'])}/{count} "
+                 f"(rank: {rep['rank_by']}, rejected: conf={rep['low_conf']}, edge={rep['edge']}, "
+                 f"size={rep['too_small']}, overlap={rep['duplicate']}).")
+        
+        # 입자 크기 통계 (필터 통과한 전체 후보 기준, 실제 스케일로 um 변환)
+        self.particle_stats.add_detections(sample_name, res['candidates'], res['pixel_scale_um'])
+        self.log(self.particle_stats.describe(sample_name))
+
+    def _run_two_phase(self, active_slots):
+        """
+        Phase 1: overviews of all slots back to back; detection / selection /
+        saving of each overview runs in a worker pool while the stage already
+        travels to the next slot.
+        Phase 2: one high-mag tour over the targets of all slots, ordered to
+        minimise stage travel. File names keep the per-slot selection rank, so
+        the output is the same as in the slot-by-slot mode.
+        """
+        slots = []
+        for sid, data in active_slots.items():
+            if sid not in SLOT_COORDINATES:
+                self.log(f"[Warning] No coordinates defined for Slot #{sid}. Skipping.")
+                continue
+            slots.append((sid, data['name'], data['settings']))
+        if any(s.get('search_rings', self.search_rings) for _, _, s in slots):
+            self.log("[Warning] Adaptive search is not used in two-phase mode (one overview per slot).")
+        
+        # 모든 슬롯의 오버뷰를 Phase 2 끝까지 유지하므로, 고배율 작업 프레임이 쓸 버퍼를 그만큼 더 확보
+        self.sem.frame_pool.reserve(len(slots) + self.sem.frame_pool_size)
+        overviews = {}
+        try:
+            # --- Phase 1: 오버뷰 일괄 촬영, 분석은 워커 풀에서 ---
+            t0 = time.perf_counter()
+            detect_lock = threading.Lock()  # 탐지 모델 하나를 여러 스레드가 공유
+            futures = {}
+            with ThreadPoolExecutor(max_workers=self.analysis_workers, thread_name_prefix="overview") as pool:
+                for sid, sample_name, settings in slots:
+                    cx, cy = SLOT_COORDINATES[sid]
+                    self.log(f"\n>>>> [Phase 1] Overview: {sample_name} (Slot #{sid}) at ({cx}, {cy})")
+                    frame, meta = self._acquire_overview(settings, cx, cy)
+                    overviews[sid] = frame
+                    futures[sid] = pool.submit(self._analyze_overview, sid, sample_name, settings, frame.array, meta,
+                                               (cx, cy), settings['high_count'], copy.copy(self.selector),
+                                               detect_lock=detect_lock)
+                # 슬롯 순서대로 병합 (로그/통계 순서가 실행마다 같도록)
+                results = {sid: futures[sid].result() for sid, _, _ in slots}
+            self.log(f"\n>>>> [Phase 1] {len(slots)} overview(s) done in {time.perf_counter() - t0:.1f}s")
+            
+            stops = []
+            for sid, sample_name, settings in slots:
+                res = results[sid]
+                self._log_analysis(sample_name, res, settings['high_count'])
+                self.progress.overview_done(sid, len(res['targets']))
+                h, w = overviews[sid].array.shape[:2]
+                cx, cy = res['center']
+                mm = res['pixel_scale_um'] / 1000.0
+                for j, target in enumerate(res['targets']):
+                    stops.append((sid, j, cx + (target['x'] - w / 2) * mm, cy + (target['y'] - h / 2) * mm))
+            
+            # --- Phase 2: 전체 타겟을 하나의 최단 경로로 촬영 ---
+            start = self.sem.get_stage_position()
+            order = plan_tour([(x, y) for _, _, x, y in stops], start=start)
+            naive = tour_length([(x, y) for _, _, x, y in stops], range(len(stops)), start)
+            planned = tour_length([(x, y) for _, _, x, y in stops], order, start)
+            self.log(f"\n>>>> [Phase 2] High-mag tour: {len(stops)} target(s), stage travel {planned:.3f} "
+                     f"(slot-by-slot order: {naive:.3f})")
+            
+            names = {sid: (sample_name, settings) for sid, sample_name, settings in slots}
+            for k in order:
+                sid, j, _, _ = stops[k]
+                sample_name, settings = names[sid]
+                res = results[sid]
+                cx, cy = res['center']
+                self.log(f"   [{sample_name}]")
+                self._image_target(sid, sample_name, settings, j, res['targets'][j], overviews[sid].array,
+                                   res['pixel_scale_um'], cx, cy)
+                self.progress.target_done(sid)
+                self.log(f"       [ETA] {self.progress.describe()}")
+            for sid, _, _ in slots:
+                self.progress.slot_done(sid)
+        finally:
+            for frame in overviews.values():
+                frame.release()
+
+    def _image_target(self, sid, sample_name, settings, j, target, low_mag_img, pixel_scale_um, start_x, start_y):
+        """Moves onto one selected particle and shoots High Mag 1 (+ optional High Mag 2)."""
+        img_h, img_w = low_mag_img.shape[:2]
+        
+        # 3-1. 타겟 좌표 계산
+        dx_px = target['x'] - (img_w / 2)
+        dy_px = target['y'] - (img_h / 2)
+        
+        # [중요] 단위 변환: um -> mm (나누기 1000)
+        # 스테이지는 mm 단위, 이미지 분석은 um 단위이므로 변환 필수
+        dx_mm = (dx_px * pixel_scale_um) / 1000.0
+        dy_mm = (dy_px * pixel_scale_um) / 1000.0
+        
+        # (주의: SEM 장비마다 축 방향이 다를 수 있음. +,- 부호 확인 필요)
+        # 누적된 드리프트/스케일 추정치로 미리 보정 (이전 타겟들의 정합 결과로 학습)
+        pred_x, pred_y = self.registrar.drift.predict(dx_mm, dy_mm)
+        target_x = start_x + dx_mm - pred_x
+        target_y = start_y + dy_mm - pred_y
+        
+        self.log(f"   --> Target #{j+1}: Moving to ({target_x:.4f}, {target_y:.4f}) [Shift: {dx_mm*1000:.1f} um, {dy_mm*1000:.1f} um]")
+        self.sem.move_stage(target_x, target_y)
+        
+        # 3-2. High Mag 1 (예: x20,000)
+        mag1 = settings['high_mag']
+        self.log(f"       [High Mag 1] Shooting x{mag1}")
+        self.sem.set_magnification(mag1)
+        self.sem.auto_focus() # 고배율일수록 초점 다시 맞춰야 함
+        frame1 = self.sem.acquire_frame()
+        try:
+            # 3-2-1. 드리프트 보정: 고배율 프레임을 저배율 오버뷰의 예상 영역과 위상상관으로 정합
+            if settings.get('drift_correction', True):
+                frame1 = self._register_target(low_mag_img, target, pixel_scale_um, frame1, mag1,
+                                               (dx_mm, dy_mm), (pred_x, pred_y), (target_x, target_y))
+            
+            self._save_frame(
+                frame1.array, 
+                f"Particle_{j+1:03d}_x{mag1}.jpg", 
+                subdir=os.path.join(sample_name, f"HighMag_x{mag1}"),
+                metadata=self._capture_metadata(sid, sample_name, "high_mag_1", self.sem.acquisition_metadata(),
+                                                200000 / mag1 / frame1.array.shape[1], target=target, index=j+1)
+            )
+        finally:
+            frame1.release()
+        
+        # 3-3. High Mag 2 (예: x50,000) - 더 확대!
+        # settings에 'high_mag_2'가 있고, 0보다 클 때만 실행
+        mag2 = settings.get('high_mag_2', 0)
+        if mag2 > mag1:
+            self.log(f"       [High Mag 2] Zooming in to x{mag2}")
+            self.sem.set_magnification(mag2)
+            self.sem.auto_focus() # 고배율일수록 초점 다시 맞춰야 함
+            with self.sem.acquire_frame() as frame2:
+                self._save_frame(
+                    frame2.array, 
+                    f"Particle_{j+1:03d}_x{mag2}.jpg", 
+                    subdir=os.path.join(sample_name, f"SuperHighMag_x{mag2}"),
+                    metadata=self._capture_metadata(sid, sample_name, "high_mag_2", self.sem.acquisition_metadata(),
+                                                    200000 / mag2 / frame2.array.shape[1], target=target, index=j+1)
+                )
+
+    def _save_frame(self, image, filename, subdir, metadata):
+        t0 = time.perf_counter()
+        path = self.file_manager.save_image(image, filename, subdir=subdir, metadata=metadata)
+        self.sem.op_log.record('save', time.perf_counter() - t0)
+        return path
+
+    def _capture_metadata(self, sid, sample_name, role, instrument, pixel_scale_um, **extra):
+        """Acquisition metadata stored with every saved frame."""
+        meta = {
+            'sample': sample_name,
+            'slot': sid,
+            'role': role,
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'simulation': self.simulation,
+            'pixel_size_um': pixel_scale_um,
+            'model': self.ai.model_version,
+        }
+        meta.update(instrument)
+        meta.update(extra)
+        return meta
+
+    def _register_target(self, overview, target, overview_scale_um, frame, mag, offset_mm, predicted_mm, commanded):
+        """
+        Measures where the high-mag frame really landed relative to the overview,
+        feeds the drift model and, if the miss is too large, moves onto the
+        particle and re-acquires. Returns the FrameBuffer to keep (the replaced one is released).
+        """
+        frame_fov_um = 200000 / mag
+        frame_scale_um = frame_fov_um / frame.array.shape[1]
+        err_um = self.registrar.measure(overview, (target['x'], target['y']), overview_scale_um, frame.array, frame_scale_um)
+        if err_um is None:
+            return frame
+        
+        err_x_mm, err_y_mm = err_um[0] / 1000.0, err_um[1] / 1000.0
+        # 모델은 보정 전 전체 오차를 학습 (이미 적용한 예측분을 다시 더함)
+        if not self.registrar.drift.update(offset_mm[0], offset_mm[1], err_x_mm + predicted_mm[0], err_y_mm + predicted_mm[1]):
+            self.log(f"       [Drift] Off by ({err_um[0]:.2f}, {err_um[1]:.2f}) um - far outside the drift model, not learned.")
+        
+        if not self.registrar.needs_correction(err_um, frame_fov_um):
+            self.log(f"       [Drift] Off by ({err_um[0]:.2f}, {err_um[1]:.2f}) um - within tolerance.")
+            return frame
+        
+        self.registrar.stats['corrected'] += 1
+        self.log(f"       [Drift] Off by ({err_um[0]:.2f}, {err_um[1]:.2f}) um - correcting and re-acquiring.")
+        self.sem.move_stage(commanded[0] - err_x_mm, commanded[1] - err_y_mm)
+        frame.release()
+        return self.sem.acquire_frame()
+
+    def _write_session_summary(self):
+        """Writes per-session artifacts (statistics, report) and the summary log."""
+        session_dir = self.file_manager.current_session_dir
+        stats_path = self.particle_stats.write(session_dir)
+        self.log(f"[Summary] Particle statistics saved: {stats_path}")
+        for sample_name in self.particle_stats.samples:
+            self.file_manager.log(self.particle_stats.describe(sample_name))
+        
+        cmd = self.sem.command_summary()
+        self.log(f"[Summary] Instrument commands sent: {sum(cmd['sent'].values())}, elided (no-op): {cmd['elided_total']} "
+                 f"(mag {cmd['elided']['set_magnification']}, move {cmd['elided']['move_stage']}, "
+                 f"AF {cmd['elided']['auto_focus']}), external stage changes: {cmd['external_changes']}")
+        self.file_manager.log(f"Instrument commands: {cmd}")
+        
+        reg = self.registrar.summary()
+        self.log(f"[Summary] Drift registration: {reg['registered']} matched, {reg['corrected']} corrected, "
+                 f"{reg['low_confidence']} low-confidence, "
+                 f"{reg['out_of_range'] + reg['featureless']} out-of-range/featureless, {reg['rejected']} outliers, "
+                 f"{reg['mean_ms']:.1f} ms/frame; "
+                 f"drift=({reg['drift_x_um']:.2f}, {reg['drift_y_um']:.2f}) um, FOV scale={reg['fov_scale']:.4f}")
+        self.file_manager.log(f"Drift registration: {reg}")
+        
+        pool = self.sem.frame_pool.stats()
+        self.log(f"[Summary] Frame pool: {pool['acquires']} frames, {pool['reuse_rate']:.0%} reused, "
+                 f"peak {pool['peak_in_use']}/{pool['capacity']} buffers ({pool['peak_bytes'] / 1e6:.1f} MB), "
+                 f"overflow {pool['overflow']}")
+        self.file_manager.log(f"Frame pool: {pool}")
+        
+        searched = {k: v for k, v in self.search_report.items() if v['rings']}
+        if searched:
+            for sample_name, r in searched.items():
+                self.log(f"[Summary] Search {sample_name}: {r['tiles']} tile(s), {r['imaged']}/{r['requested']} imaged, "
+                         f"{r['seconds']:.1f}s")
+            self.file_manager.log(f"Adaptive search: {searched}")
+        
+        if self.progress is not None:
+            self.log(f"[Summary] Run time: {format_duration(self.progress.elapsed)} "
+                     f"(planned {format_duration(self.progress.predicted_total)})")
+        
+        if getattr(self.ai, 'restarts', 0):
+            self.log(f"[Summary] Inference server restarts: {self.ai.restarts}")
+        ReportGenerator(session_dir).generate_report()
\ No newline at end of file
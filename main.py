@@ -2,15 +2,78 @@ import argparse
 import sys
 import os
 from core.workflow import AutomationManager
+from core.inference_backends import BACKENDS
+from utils.capture_writer import FORMATS, TIFF_COMPRESSIONS
 
 def main():
     parser = argparse.ArgumentParser(description="Smart-SEM Automation System")
     parser.add_argument("--simulation", action="store_true", help="Run in simulation mode (Mock Hardware)")
+    parser.add_argument("--sim-particles", type=int, default=None,
+                        help="Simulation: generate a world with N particles (default: original 9-particle layout)")
+    parser.add_argument("--sim-seed", type=int, default=0, help="Simulation: random seed of the generated world")
+    parser.add_argument("--sim-world-size", type=float, default=None,
+                        help="Simulation: sample width in um (default: scaled to --sim-particles for a constant density)")
+    parser.add_argument("--sim-particle-size", type=float, default=8.0, help="Simulation: median particle radius in um")
+    parser.add_argument("--sim-fast", action="store_true", help="Simulation: no artificial stage/scan delays (stress tests)")
     parser.add_argument("--model", type=str, default="yolov8n.pt", help="Path to YOLO model or model name")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch",
+                        help="Inference backend: torch (ultralytics), onnx, onnx-int8 (quantized) or openvino")
+    parser.add_argument("--inference-process", action="store_true",
+                        help="Run YOLO in a separate server process (frames via shared memory)")
+    parser.add_argument("--export", action="store_true", help="Convert --model for --backend once (cached next to the .pt) and exit")
+    parser.add_argument("--benchmark-backends", action="store_true",
+                        help="Compare latency and detection agreement of all backends on the simulator images and exit")
+    parser.add_argument("--capture-format", choices=FORMATS, default="tiff", help="Image format for saved frames (default: lossless TIFF)")
+    parser.add_argument("--compression", choices=TIFF_COMPRESSIONS, default="deflate", help="TIFF compression")
+    parser.add_argument("--compression-level", type=int, default=6, help="deflate/zstd level (TIFF) or 0-9 (PNG)")
+    parser.add_argument("--jpeg-preview", action="store_true", help="Also write a small JPEG preview next to each lossless frame")
+    parser.add_argument("--benchmark-capture", action="store_true",
+                        help="Compare output size and encode speed of the capture formats on the simulator images and exit")
+    parser.add_argument("--budget-hours", type=float, default=None,
+                        help="Instrument time available; per-slot particle counts / High Mag 2 are reduced to fit")
+    parser.add_argument("--search-rings", type=int, default=0,
+                        help="Adaptive search: if the overview has too few particles, scan up to N rings of tiles around it")
+    parser.add_argument("--two-phase", action="store_true",
+                        help="Shoot all overviews first (analysed in parallel), then one optimized high-mag tour over all slots")
+    parser.add_argument("--analysis-workers", type=int, default=2, help="Worker threads for overview analysis with --two-phase")
     parser.add_argument("--gui", action="store_true", help="Launch Graphical User Interface")
+    parser.add_argument("--calibrate-settle", action="store_true",
+                        help="Measure stage settle time vs. move distance from the current position, save it and exit")
+    parser.add_argument("--reanalyze", nargs="?", const="results", metavar="RESULTS_DIR",
+                        help="Re-run detection over saved Session_* overview images (offline, incremental)")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size for --reanalyze (default: CPU count - 1)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Images per inference batch for --reanalyze")
+    parser.add_argument("--force", action="store_true", help="With --reanalyze / --export: ignore cached results and redo everything")
     
     args = parser.parse_args()
 
+    # 0. 오프라인 재분석 (장비 연결 없음)
+    if args.reanalyze:
+        from core.reanalyzer import SessionReanalyzer
+        SessionReanalyzer(model_path=args.model, workers=args.workers, batch_size=args.batch_size,
+                          backend=args.backend).run(results_dir=args.reanalyze, force=args.force)
+        return
+
+    # 0-1. 모델 변환 / 백엔드 벤치마크
+    if args.export:
+        from core.inference_backends import export_model
+        print(f"[INFO] Exported model: {export_model(args.model, args.backend, force=args.force)}")
+        return
+    if args.benchmark_backends:
+        from core.inference_backends import benchmark_backends
+        benchmark_backends(args.model)
+        return
+
+    if args.benchmark_capture:
+        from core.inference_backends import load_simulator_images
+        from utils.capture_writer import benchmark_formats
+        images = load_simulator_images()
+        if not images:
+            print("[INFO] No simulator images found under results/Session_*.")
+        else:
+            benchmark_formats(images)
+        return
+
     # 1. GUI 실행
     if args.gui:
         from ui.gui import launch_gui
@@ -28,12 +91,31 @@ def main():
         print("[INFO] Running in REAL HARDWARE MODE")
         
     try:
-        app = AutomationManager(simulation=args.simulation, model_path=args.model)
+        sim_options = {'n_particles': args.sim_particles, 'seed': args.sim_seed,
+                       'world_size': args.sim_world_size, 'size_median': args.sim_particle_size}
+        if args.sim_fast:
+            sim_options.update(move_time=0, mag_time=0, af_time=0, scan_time=0)
+        if args.calibrate_settle:
+            from core.microscope import MicroscopeController
+            sem = MicroscopeController(simulation=args.simulation, sim_options=sim_options)
+            sem.connect()
+            sem.calibrate_settle()
+            return
+
+        capture_options = {'fmt': args.capture_format, 'compression': args.compression,
+                           'level': args.compression_level, 'preview_jpeg': args.jpeg_preview}
+        app = AutomationManager(simulation=args.simulation, model_path=args.model, backend=args.backend,
+                                sim_options=sim_options, capture_options=capture_options,
+                                inference_process=args.inference_process, search_rings=args.search_rings,
+                                two_phase=args.two_phase, analysis_workers=args.analysis_workers)
         
         # CLI 테스트용 데이터
         print("[INFO] GUI 모드가 아니므로 기본 설정으로 실행합니다.")
         dummy_data = {1: {'name': 'CLI_Test_Sample', 'settings': {'low_mag': 1000, 'high_count': 3, 'high_mag': 5000}}}
-        app.run(active_slots=dummy_data)
+        try:
+            app.run(active_slots=dummy_data, budget_s=args.budget_hours * 3600 if args.budget_hours else None)
+        finally:
+            app.close()
 
     except KeyboardInterrupt:
         print("\n[INFO] Process interrupted by user.")
@@ -320,6 +320,27 @@ class SmartSEMApp:
         # Separator
         ttk.Separator(parent, orient=tk.HORIZONTAL).pack(fill=tk.X, pady=20)
         
+        # AI를 별도 프로세스에서 실행 (탐지 중 GUI 멈춤 방지)
+        self.var_inference_process = tk.BooleanVar(value=False)
+        ttk.Checkbutton(parent, text="Run AI in separate process (smooth GUI)", variable=self.var_inference_process).pack(anchor=tk.W)
+        # 2단계 모드: 모든 슬롯 오버뷰 먼저 (분석은 병렬), 고배율은 전체를 한 경로로
+        self.var_two_phase = tk.BooleanVar(value=False)
+        ttk.Checkbutton(parent, text="Two-phase run (all overviews first, one high-mag tour)", variable=self.var_two_phase).pack(anchor=tk.W)
+        
+        # 장비 사용 가능 시간: 넘으면 슬롯별 촬영 수 / High Mag 2 를 자동으로 줄임
+        frame_budget = ttk.Frame(parent)
+        frame_budget.pack(fill=tk.X, pady=5)
+        ttk.Label(frame_budget, text="Time Budget (h, 0 = no limit):").pack(side=tk.LEFT)
+        self.var_budget_hours = tk.StringVar(value="0")
+        ttk.Entry(frame_budget, textvariable=self.var_budget_hours, width=6).pack(side=tk.LEFT, padx=5)
+        
+        # 오버뷰에서 입자가 부족하면 주변 타일을 나선형으로 추가 탐색 (0 = 오버뷰 1장만)
+        frame_search = ttk.Frame(parent)
+        frame_search.pack(fill=tk.X, pady=5)
+        ttk.Label(frame_search, text="Search Rings (0 = single overview):").pack(side=tk.LEFT)
+        self.var_search_rings = tk.StringVar(value="0")
+        ttk.Entry(frame_search, textvariable=self.var_search_rings, width=6).pack(side=tk.LEFT, padx=5)
+        
         # Run Button
         self.btn_run = ttk.Button(parent, text="START AUTOMATION", command=self.start_automation)
         self.btn_run.pack(fill=tk.X, pady=10, ipady=10)
@@ -412,6 +433,17 @@ class SmartSEMApp:
             messagebox.showerror("Error", "Please select at least one sample slot!")
             return
             
+        try:
+            budget_s = float(self.var_budget_hours.get() or 0) * 3600
+        except ValueError:
+            messagebox.showerror("Error", "Time budget must be a number (hours).")
+            return
+        try:
+            search_rings = int(self.var_search_rings.get() or 0)
+        except ValueError:
+            messagebox.showerror("Error", "Search rings must be a whole number.")
+            return
+            
         summary = f"총 {len(active_slots)}개 샘플을 분석합니다.\n진행하시겠습니까?"
         if messagebox.askyesno("Confirm Start", summary):
             # 창을 닫지 않고 버튼만 비활성화
@@ -419,11 +451,14 @@ class SmartSEMApp:
             self.log_message(">>> 자동화 스레드를 시작합니다...")
             
             # 스레드로 실행 (GUI 멈춤 방지 + 실시간 로그)
-            thread = threading.Thread(target=self.run_workflow_thread, args=(active_slots,))
+            thread = threading.Thread(target=self.run_workflow_thread,
+                                      args=(active_slots, self.var_inference_process.get(), budget_s or None, search_rings,
+                                            self.var_two_phase.get()))
             thread.daemon = True # 프로그램 종료 시 스레드도 강제 종료
             thread.start()
 
-    def run_workflow_thread(self, active_slots):
+    def run_workflow_thread(self, active_slots, inference_process=False, budget_s=None, search_rings=0, two_phase=False):
+        manager = None
         try:
             # 시뮬레이션 모드 판단 (tescanautomation 라이브러리 유무 체크)
             try:
@@ -435,10 +470,12 @@ class SmartSEMApp:
                 self.log_message("[System] Tescan 라이브러리 없음. SIMULATION MODE로 실행합니다.")
 
             # 매니저 생성 (로그 콜백 연결)
-            manager = AutomationManager(simulation=sim_mode, log_callback=self.log_message)
+            manager = AutomationManager(simulation=sim_mode, log_callback=self.log_message,
+                                        inference_process=inference_process, search_rings=search_rings,
+                                        two_phase=two_phase)
             
             # 실행
-            manager.run(active_slots)
+            manager.run(active_slots, budget_s=budget_s)
             
             self.log_message(">>> 모든 작업이 완료되었습니다.")
             messagebox.showinfo("Done", "분석이 완료되었습니다.")
@@ -448,6 +485,8 @@ class SmartSEMApp:
             import traceback
             traceback.print_exc()
         finally:
+            if manager is not None:
+                manager.close()
             # 버튼 다시 활성화 (메인 스레드에서 처리해야 안전하므로 after 사용)
             self.root.after(0, lambda: self.btn_run.config(state=tk.NORMAL, text="START AUTOMATION"))
 
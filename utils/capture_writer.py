@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import cv2
+import numpy as np
+
+try:
+    import tifffile  # embedded metadata + compression levels for TIFF (requirements.txt; lzw/zstd need imagecodecs)
+except ImportError:
+    tifffile = None
+
+FORMATS = ("tiff", "png", "jpeg")
+TIFF_COMPRESSIONS = ("none", "lzw", "deflate", "zstd")
+
+# OpenCV TIFF codes (numeric so older OpenCV builds without the named constants work too)
+_CV_TIFF_CODES = {"none": 1, "lzw": 5, "deflate": 8, "zstd": 50000}
+_TIFFFILE_CODES = {"none": None, "lzw": "lzw", "deflate": "zlib", "zstd": "zstd"}
+_EXTENSIONS = {"tiff": ".tif", "png": ".png", "jpeg": ".jpg"}
+
+
+class CaptureWriter:
+    """
+    Writes acquired frames losslessly (TIFF deflate/zstd/lzw or PNG) with the
+    acquisition metadata attached, optionally plus a small JPEG preview.
+
+    - 8/16-bit data is written at its native depth.
+    - Gray frames stored as 3 identical BGR channels are collapsed to 1 channel.
+    - Metadata goes into the TIFF ImageDescription tag when tifffile is
+      installed; otherwise (and always for PNG/JPEG) into a <name>.json sidecar.
+
+    Without tifffile, TIFF goes through OpenCV: the compression level cannot be
+    set and metadata always goes to the sidecar. A TIFF compression the active
+    path cannot write is rejected here, not at the first save; describe() names
+    what is really written.
+    """
+
+    def __init__(self, fmt="tiff", compression="deflate", level=6, preview_jpeg=False, jpeg_quality=90,
+                 preview_max_side=1024, collapse_gray=True):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown capture format '{fmt}'. Choose from {FORMATS}")
+        if fmt == "tiff" and compression not in TIFF_COMPRESSIONS:
+            raise ValueError(f"Unknown TIFF compression '{compression}'. Choose from {TIFF_COMPRESSIONS}")
+        self.fmt = fmt
+        self.compression = compression
+        self.level = level
+        self.preview_jpeg = preview_jpeg
+        self.jpeg_quality = jpeg_quality
+        self.preview_max_side = preview_max_side
+        self.collapse_gray = collapse_gray
+        self.tiff_backend = "tifffile" if tifffile is not None else "opencv"
+        if fmt == "tiff":
+            self._check_tiff_support()
+
+    def _check_tiff_support(self):
+        probe_dir = tempfile.mkdtemp(prefix="capture_probe_")
+        try:
+            self._write_tiff(np.zeros((8, 8), dtype=np.uint8), os.path.join(probe_dir, "probe.tif"), None)
+        except Exception as e:
+            hint = "pip install imagecodecs" if tifffile is not None else "pip install tifffile imagecodecs"
+            raise ValueError(f"TIFF compression '{self.compression}' is not available via {self.tiff_backend} "
+                             f"({e}); {hint} or choose another compression") from None
+        finally:
+            shutil.rmtree(probe_dir, ignore_errors=True)
+        if self.tiff_backend == "opencv" and self.compression in ("deflate", "zstd"):
+            print(f"[Capture] tifffile not installed: TIFF {self.compression} uses OpenCV's default level "
+                  f"(level {self.level} ignored) and metadata goes to .json sidecars.")
+
+    @property
+    def extension(self):
+        return _EXTENSIONS[self.fmt]
+
+    def describe(self):
+        if self.fmt == "tiff":
+            if self.tiff_backend == "opencv":
+                return f"tiff/{self.compression} (cv2)"  # OpenCV: fixed level, sidecar metadata
+            return f"tiff/{self.compression}" + (f"-{self.level}" if self.compression in ("deflate", "zstd") else "")
+        if self.fmt == "png":
+            return f"png/{self.level}"
+        return f"jpeg/q{self.jpeg_quality}"
+
+    def write(self, image, path, metadata=None):
+        """
+        Writes `image` to `path` (extension replaced by the format's) and returns the
+        final path. `metadata` is a JSON-serialisable dict.
+        """
+        path = os.path.splitext(path)[0] + self.extension
+        data = self._prepare(image)
+        embedded = False
+
+        if self.fmt == "tiff":
+            embedded = self._write_tiff(data, path, metadata)
+        elif self.fmt == "png":
+            ok = cv2.imwrite(path, data, [cv2.IMWRITE_PNG_COMPRESSION, int(self.level)])
+            if not ok:
+                raise IOError(f"Failed to write {path}")
+        else:
+            if data.dtype != np.uint8:
+                data = cv2.convertScaleAbs(data, alpha=255.0 / max(1, int(data.max())))
+            if not cv2.imwrite(path, data, [cv2.IMWRITE_JPEG_QUALITY, int(self.jpeg_quality)]):
+                raise IOError(f"Failed to write {path}")
+
+        if metadata and not embedded:
+            with open(os.path.splitext(path)[0] + ".json", "w", encoding="utf-8") as f:
+                json.dump(metadata, f, indent=1, default=_json_default)
+
+        if self.preview_jpeg and self.fmt != "jpeg":
+            self._write_preview(data, os.path.splitext(path)[0] + ".preview.jpg")
+        return path
+
+    def _prepare(self, image):
+        if self.collapse_gray and image.ndim == 3 and image.shape[2] == 3:
+            b = image[..., 0]
+            if np.array_equal(b, image[..., 1]) and np.array_equal(b, image[..., 2]):
+                return np.ascontiguousarray(b)
+        return image
+
+    def _write_tiff(self, data, path, metadata):
+        """Returns True when the metadata was embedded in the file."""
+        description = json.dumps(metadata, default=_json_default) if metadata else None
+        if tifffile is not None:
+            rgb = data.ndim == 3
+            if rgb:
+                data = cv2.cvtColor(data, cv2.COLOR_BGR2RGB)
+            compression = _TIFFFILE_CODES[self.compression]
+            kwargs = {'photometric': 'rgb' if rgb else 'minisblack', 'description': description, 'metadata': None}
+            if compression:
+                kwargs['compression'] = compression
+                if self.compression in ("deflate", "zstd"):
+                    kwargs['compressionargs'] = {'level': int(self.level)}
+                # Horizontal differencing helps deflate/zstd/lzw a lot on smooth SEM images
+                kwargs['predictor'] = True
+            tifffile.imwrite(path, data, **kwargs)
+            return description is not None
+
+        params = [cv2.IMWRITE_TIFF_COMPRESSION, _CV_TIFF_CODES[self.compression]]
+        predictor = getattr(cv2, "IMWRITE_TIFF_PREDICTOR", None)
+        if predictor is not None and self.compression != "none":
+            params += [predictor, 2]
+        if not cv2.imwrite(path, data, params):
+            raise IOError(f"Failed to write {path} (TIFF {self.compression} not supported by this OpenCV build?)")
+        return False
+
+    def _write_preview(self, data, path):
+        if data.dtype != np.uint8:
+            data = cv2.convertScaleAbs(data, alpha=255.0 / max(1, int(data.max())))
+        h, w = data.shape[:2]
+        scale = self.preview_max_side / max(h, w)
+        if scale < 1:
+            data = cv2.resize(data, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        cv2.imwrite(path, data, [cv2.IMWRITE_JPEG_QUALITY, int(self.jpeg_quality)])
+
+
+def _json_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return str(obj)
+
+
+DEFAULT_BENCHMARK_CONFIGS = (
+    {'fmt': "jpeg", 'jpeg_quality': 95},
+    {'fmt': "png", 'level': 1},
+    {'fmt': "png", 'level': 6},
+    {'fmt': "png", 'level': 9},
+    {'fmt': "tiff", 'compression': "none"},
+    {'fmt': "tiff", 'compression': "lzw"},
+    {'fmt': "tiff", 'compression': "deflate", 'level': 1},
+    {'fmt': "tiff", 'compression': "deflate", 'level': 6},
+    {'fmt': "tiff", 'compression': "zstd", 'level': 3},
+    {'fmt': "tiff", 'compression': "zstd", 'level': 10},
+)
+
+
+def benchmark_formats(images, configs=DEFAULT_BENCHMARK_CONFIGS, repeats=3):
+    """
+    Output size and encode throughput of each capture configuration on the given
+    frames. Prints a table and returns the rows (unsupported configs are skipped).
+    """
+    raw_bytes = sum(img.nbytes for img in images)
+    tmp_dir = tempfile.mkdtemp(prefix="capture_bench_")
+    rows = []
+    seen = set()
+    try:
+        for cfg in configs:
+            try:
+                writer = CaptureWriter(**cfg)
+            except ValueError as e:
+                print(f"[Benchmark] {cfg}: skipped ({e})")
+                continue
+            if writer.describe() in seen:
+                continue  # same output as a config already measured (e.g. level ignored by OpenCV)
+            seen.add(writer.describe())
+            try:
+                t0 = time.perf_counter()
+                size = 0
+                for r in range(repeats):
+                    for i, img in enumerate(images):
+                        out = writer.write(img, os.path.join(tmp_dir, f"frame_{i}"))
+                        if r == 0:
+                            size += os.path.getsize(out)
+                elapsed = time.perf_counter() - t0
+            except Exception as e:
+                print(f"[Benchmark] {writer.describe()}: skipped ({e})")
+                continue
+            rows.append({'format': writer.describe(), 'bytes': size, 'ratio': raw_bytes / max(1, size),
+                         'encode_mb_s': raw_bytes * repeats / elapsed / 1e6, 'lossless': writer.fmt != "jpeg"})
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"{'format':<20} {'MB/frame':>9} {'ratio':>7} {'enc MB/s':>9}  lossless")
+    for r in rows:
+        print(f"{r['format']:<20} {r['bytes'] / len(images) / 1e6:>9.3f} {r['ratio']:>7.2f} "
+              f"{r['encode_mb_s']:>9.1f}  {'yes' if r['lossless'] else 'no'}")
+    return rows
@@ -1,11 +1,14 @@
 import os
 import datetime
 import cv2
+from .capture_writer import CaptureWriter
 
 class FileManager:
-    def __init__(self, base_dir="results"):
+    def __init__(self, base_dir="results", writer=None):
         self.base_dir = base_dir
         self.current_session_dir = None
+        # 기본: 무손실 TIFF(deflate) + 메타데이터. writer=False 이면 예전처럼 확장자 그대로 cv2.imwrite
+        self.writer = CaptureWriter() if writer is None else writer
         self._create_session_dir()
 
     def _create_session_dir(self):
@@ -14,7 +17,11 @@ class FileManager:
         os.makedirs(self.current_session_dir, exist_ok=True)
         print(f"[FileManager] Session directory created: {self.current_session_dir}")
 
-    def save_image(self, image, filename, subdir=None):
+    def save_image(self, image, filename, subdir=None, metadata=None):
+        """
+        Saves a frame under the session directory and returns the written path
+        (the extension follows the capture writer's format).
+        """
         if subdir:
             save_path = os.path.join(self.current_session_dir, subdir)
             os.makedirs(save_path, exist_ok=True)
@@ -22,6 +29,8 @@ class FileManager:
             save_path = self.current_session_dir
             
         full_path = os.path.join(save_path, filename)
+        if self.writer:
+            return self.writer.write(image, full_path, metadata)
         cv2.imwrite(full_path, image)
         return full_path
         
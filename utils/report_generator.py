@@ -1,4 +1,5 @@
 import os
+import json
 
 class ReportGenerator:
     def __init__(self, session_dir):
@@ -12,6 +13,7 @@ class ReportGenerator:
         
         low_imgs = sorted(os.listdir(low_mag_dir)) if os.path.exists(low_mag_dir) else []
         high_imgs = sorted(os.listdir(high_mag_dir)) if os.path.exists(high_mag_dir) else []
+        stats = self._load_stats()
         
         html_content = f"""
         <!DOCTYPE html>
@@ -26,6 +28,9 @@ class ReportGenerator:
                 .card {{ border: 1px solid #ddd; padding: 10px; border-radius: 5px; text-align: center; background: #fff; }}
                 img {{ max-width: 300px; height: auto; display: block; margin-bottom: 5px; cursor: pointer; }}
                 img:hover {{ transform: scale(1.05); transition: 0.2s; }}
+                table {{ border-collapse: collapse; }}
+                th, td {{ border: 1px solid #ddd; padding: 6px 10px; text-align: right; }}
+                th {{ background: #eee; }}
             </style>
         </head>
         <body>
@@ -45,6 +50,7 @@ class ReportGenerator:
                     {''.join([self._card("HighMag/" + img, img) for img in high_imgs])}
                 </div>
             </div>
+            {self._stats_section(stats)}
         </body>
         </html>
         """
@@ -55,6 +61,36 @@ class ReportGenerator:
         print(f"[Report] Generated report at {self.html_path}")
         return self.html_path
 
+    def _load_stats(self):
+        stats_path = os.path.join(self.session_dir, "particle_stats.json")
+        if not os.path.exists(stats_path):
+            return {}
+        with open(stats_path, "r", encoding='utf-8') as f:
+            return json.load(f)
+
+    def _stats_section(self, stats):
+        if not stats:
+            return ""
+        rows = []
+        for sample_name, metrics in stats.items():
+            d = metrics.get('diameter_um', {})
+            if not d.get('count'):
+                rows.append(f"<tr><td style='text-align:left'>{sample_name}</td><td>0</td>" + "<td>-</td>" * 6 + "</tr>")
+                continue
+            q = d['quantiles']
+            cells = [d['mean'], d['std'], q['p10'], q['p50'], q['p90'], d['max']]
+            rows.append(f"<tr><td style='text-align:left'>{sample_name}</td><td>{d['count']}</td>"
+                        + "".join(f"<td>{v:.3f}</td>" for v in cells) + "</tr>")
+        return f"""
+            <div class="section">
+                <h2>3. Particle Size Statistics (equivalent diameter, um)</h2>
+                <table>
+                    <tr><th>Sample</th><th>Count</th><th>Mean</th><th>Std</th><th>D10</th><th>D50</th><th>D90</th><th>Max</th></tr>
+                    {''.join(rows)}
+                </table>
+            </div>
+        """
+
     def _card(self, rel_path, title):
         return f"""
         <div class="card">